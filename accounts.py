@@ -0,0 +1,80 @@
+"""
+User accounts for the web app, stored in ``database/users.db``.
+
+All queries go through a pooled ``db.ConnectionPool`` connection with fixed SQL
+text, so SQLite's statement cache prepares each query once per connection.
+Lookups of the logged-in user are cached for a few seconds; a successful
+login warms the cache, so authenticated pages do not query the database on
+every request.
+"""
+import threading
+import time
+
+from db import ConnectionPool
+
+USERS_DB_PATH = "database/users.db"
+
+USER_COLUMNS = ("id", "email", "age", "gender")
+
+INSERT_USER = "INSERT INTO users (email, password, age, gender) VALUES (?, ?, ?, ?)"
+SELECT_LOGIN = "SELECT id, email, age, gender FROM users WHERE email = ? AND password = ?"
+SELECT_USER = "SELECT id, email, age, gender FROM users WHERE email = ?"
+
+
+class UserStore:
+    """Signup, login and cached user lookups."""
+
+    def __init__(self, path=USERS_DB_PATH, cache_ttl=30.0):
+        self.pool = ConnectionPool(path)
+        self.cache_ttl = cache_ttl
+        self._cache = {}  # email -> (expires_at, user dict or None)
+        self._lock = threading.Lock()
+
+    def create_schema(self):
+        conn = self.pool.connection()
+        conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            email TEXT UNIQUE,
+                            password TEXT,
+                            age INTEGER,
+                            gender TEXT
+                        )''')
+        conn.commit()
+
+    def add_user(self, email, password, age=None, gender=None):
+        """Insert a user; raises ``sqlite3.IntegrityError`` if the email exists."""
+        conn = self.pool.connection()
+        with conn:
+            conn.execute(INSERT_USER, (email, password, age, gender))
+        self.forget(email)
+
+    def authenticate(self, email, password):
+        """Return the user for valid credentials, else ``None``."""
+        row = self.pool.connection().execute(SELECT_LOGIN, (email, password)).fetchone()
+        user = dict(zip(USER_COLUMNS, tuple(row))) if row else None
+        if user:
+            self._remember(email, user)
+        return user
+
+    def get_user(self, email):
+        """Cached lookup of a user by email (``None`` if unknown)."""
+        now = time.monotonic()
+        entry = self._cache.get(email)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        row = self.pool.connection().execute(SELECT_USER, (email,)).fetchone()
+        user = dict(zip(USER_COLUMNS, tuple(row))) if row else None
+        self._remember(email, user)
+        return user
+
+    def forget(self, email):
+        with self._lock:
+            self._cache.pop(email, None)
+
+    def _remember(self, email, user):
+        now = time.monotonic()
+        with self._lock:
+            self._cache[email] = (now + self.cache_ttl, user)
+            # Drop expired entries now and then so the cache stays small
+            if len(self._cache) > 10000:
+                self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
@@ -0,0 +1,100 @@
+"""
+Admission control for mood detection under overload.
+
+Every detection request asks the controller for a decision before any work
+is done. The controller counts the detections it has admitted that have not
+finished yet (plus whatever else the inference pool reports as in flight)
+against a bounded queue depth and degrades step by step as it fills up:
+
+- ``ADMIT``     below ``degrade_at``: full-resolution detection
+- ``DEGRADE``   from ``degrade_at``: detection on a downscaled frame
+- ``FALLBACK``  from ``fallback_at``: answer from the frame cache (with a
+                looser match) or the client's last known mood, and only run
+                a downscaled detection when neither exists
+- ``SHED``      queue full: no inference at all; the caller answers with
+                the last known mood or a fast ``503`` and ``Retry-After``
+
+Admitted requests also carry a deadline (``deadline`` seconds), after which
+the caller stops waiting and the pool drops the frame if it has not been
+picked up yet, so queued work never outlives its client. Latency of
+completed detections is tracked as a moving average and used as the retry
+hint for shed requests.
+"""
+import math
+import threading
+
+ADMIT = "admit"
+DEGRADE = "degrade"
+FALLBACK = "fallback"
+SHED = "shed"
+
+
+class AdmissionController:
+    """Bounded admission with step-wise degradation as the queue fills."""
+
+    def __init__(self, max_queue=32, deadline=3.0, degrade_at=0.5, fallback_at=0.75,
+                 load=None, smoothing=0.2):
+        self.max_queue = max(1, max_queue)
+        self.deadline = deadline
+        self.degrade_at = degrade_at
+        self.fallback_at = fallback_at
+        # Callable returning frames in flight from other sources (e.g. the pool)
+        self.load = load
+        self.smoothing = smoothing
+        self.active = 0
+        self.latency = None
+        self.counts = {ADMIT: 0, DEGRADE: 0, FALLBACK: 0, SHED: 0}
+        self._lock = threading.Lock()
+
+    @property
+    def occupancy(self):
+        """Detections currently queued or running."""
+        outside = self.load() if self.load is not None else 0
+        return max(self.active, outside)
+
+    @property
+    def pressure(self):
+        """Occupancy as a fraction of the queue depth (1.0 means full)."""
+        return self.occupancy / self.max_queue
+
+    def admit(self):
+        """Decide how to serve the next request; reserves a slot unless ``SHED``."""
+        with self._lock:
+            pressure = self.pressure
+            if pressure >= 1.0:
+                decision = SHED
+            else:
+                if pressure >= self.fallback_at:
+                    decision = FALLBACK
+                elif pressure >= self.degrade_at:
+                    decision = DEGRADE
+                else:
+                    decision = ADMIT
+                self.active += 1
+            self.counts[decision] += 1
+            return decision
+
+    def release(self, seconds=None):
+        """Free a slot taken by ``admit``; ``seconds`` is the detection latency, if any."""
+        with self._lock:
+            self.active = max(0, self.active - 1)
+            if seconds is not None:
+                if self.latency is None:
+                    self.latency = seconds
+                else:
+                    self.latency += self.smoothing * (seconds - self.latency)
+
+    def retry_after(self):
+        """Whole seconds a shed client should wait before trying again."""
+        latency = self.latency if self.latency is not None else self.deadline
+        return max(1, min(int(math.ceil(latency)), int(math.ceil(self.deadline))))
+
+    def stats(self):
+        return {
+            "max_queue": self.max_queue,
+            "deadline": self.deadline,
+            "occupancy": self.occupancy,
+            "pressure": round(self.pressure, 3),
+            "latency": round(self.latency, 4) if self.latency is not None else None,
+            "decisions": dict(self.counts),
+        }
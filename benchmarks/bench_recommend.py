@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the recommendation and catalog paths.
+
+- ``RankingEngine.rank`` over random emotion profiles at several catalog
+  sizes, with and without diversity re-ranking
+- ``Catalog.sample_mood``, ``Catalog.get_songs`` and ``Recommender.recommend``
+  against a temporary catalog filled through the bulk importer
+- perceptual hashing and ``FrameCache`` lookups
+
+Results are written as JSON to ``benchmarks/results/``.
+
+Usage:
+
+  $ python3 benchmarks/bench_recommend.py
+  $ python3 benchmarks/bench_recommend.py --engine-sizes 10000 1000000 --catalog-sizes 50000
+"""
+import argparse
+import csv
+import random
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import summarize, synthetic_face, time_calls, write_results  # noqa: E402
+from catalog import EMOTIONS, Catalog  # noqa: E402
+from frame_cache import FrameCache, dhash  # noqa: E402
+from ranking import RankingEngine, Recommender  # noqa: E402
+import ingest  # noqa: E402
+
+MOODS = ("happy", "sad", "angry", "neutral", "surprise")
+QUERY = {"happy": 0.55, "surprise": 0.25, "neutral": 0.2}
+
+
+def bench_engine(sizes, repeat):
+    results = {}
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        engine = RankingEngine(np.arange(size), rng.random((size, len(EMOTIONS))), seed=0)
+        results[f"rank@{size}"] = summarize(time_calls(lambda: engine.rank(QUERY, k=4), repeat))
+        results[f"rank_diverse@{size}"] = summarize(time_calls(
+            lambda: engine.rank(QUERY, k=4, diversity=0.3), repeat))
+        results[f"scores@{size}"] = summarize(time_calls(lambda: engine.scores(QUERY), repeat))
+    return results
+
+
+def build_catalog(workdir, size):
+    """Create a catalog with ``size`` generated songs using the bulk importer."""
+    source = Path(workdir) / f"tracks-{size}.csv"
+    rng = random.Random(size)
+    with open(source, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "singer", "spotify_url", "moods"])
+        for i in range(size):
+            writer.writerow([f"Track {i}", f"Artist {i % 1000}",
+                             f"https://open.spotify.com/track/{i}",
+                             ";".join(rng.sample(MOODS, 2))])
+    db_path = Path(workdir) / f"catalog-{size}.db"
+    ingest.import_file(source, db_path, progress=lambda message: None)
+    catalog = Catalog(db_path)
+    catalog.ensure_schema()
+    return catalog
+
+
+def bench_catalog(workdir, sizes, repeat):
+    results = {}
+    for size in sizes:
+        catalog = build_catalog(workdir, size)
+        recommender = Recommender(catalog, diversity=0.1)
+        ids = recommender.engine.song_ids
+        sample_ids = [int(i) for i in ids[:4]]
+        results[f"sample_mood@{size}"] = summarize(time_calls(
+            lambda: catalog.sample_mood("happy", k=4), repeat))
+        results[f"get_songs_cached@{size}"] = summarize(time_calls(
+            lambda: catalog.get_songs(sample_ids), repeat))
+        results[f"get_songs_cold@{size}"] = summarize(time_calls(
+            lambda: catalog.get_songs([int(i) for i in np.random.choice(ids, 4)]), repeat))
+        results[f"recommend@{size}"] = summarize(time_calls(
+            lambda: recommender.recommend(QUERY, k=4), repeat))
+    return results
+
+
+def bench_frame_cache(repeat):
+    frame = synthetic_face(640, 480)
+    cache = FrameCache(max_entries=512, ttl=60, max_distance=4)
+    rng = np.random.default_rng(0)
+    for key in rng.integers(0, 2 ** 63, 512):
+        cache.put(int(key), [])
+    probe = dhash(frame)
+    return {
+        "dhash@480p": summarize(time_calls(lambda: dhash(frame), repeat)),
+        "cache_miss_scan@512": summarize(time_calls(lambda: cache.get(probe), repeat)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recommendation and catalog paths.")
+    parser.add_argument("--engine-sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--out", help="result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="melobot-bench-")
+    try:
+        results = {
+            "config": vars(args),
+            "engine": bench_engine(args.engine_sizes, args.repeat),
+            "catalog": bench_catalog(workdir, args.catalog_sizes, args.repeat),
+            "frame_cache": bench_frame_cache(args.repeat),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for group in ("engine", "catalog", "frame_cache"):
+        for name, summary in results[group].items():
+            print(f"{group:<12} {name:<28} p50={summary['p50_ms']}ms p99={summary['p99_ms']}ms")
+    print(f"Results written to {write_results('recommend', results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
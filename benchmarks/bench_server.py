@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Load and latency benchmark for the HTTP endpoints in ``server.py``.
+
+Everything runs in-process through Flask's test client, so no network or
+running server is needed. The app is imported inside a throw-away working
+directory with a copy of the catalog, so benchmark signups and feedback
+never touch the real databases.
+
+Scenarios:
+
+- ``detect_mood`` with synthetic face frames at several resolutions and
+  upload formats (legacy PNG data URL, raw JPEG, raw WebP)
+- ``emoji_recommend``, ``login`` and ``signup``
+- a per-stage breakdown of the detection path (decode, detect, classify,
+  recommend, serialize), timed by calling each stage directly
+
+Each scenario is run at every requested concurrency level; results
+(p50/p95/p99 latency, throughput, errors) are written as JSON to
+``benchmarks/results/`` so runs can be compared. The detection queue is made
+deep enough that admission control does not kick in; if it is lowered
+(``DETECT_QUEUE_DEPTH``), shed (``503``) and degraded answers are counted
+separately and left out of the latency figures.
+
+Usage:
+
+  $ python3 benchmarks/bench_server.py
+  $ python3 benchmarks/bench_server.py --requests 500 --concurrency 1 4 16
+  $ python3 benchmarks/bench_server.py --skip-detect      # auth/emoji routes only
+"""
+import argparse
+import base64
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import (  # noqa: E402
+    FORMATS, REPO_ROOT, RESOLUTIONS, encode_frame, summarize, synthetic_face, time_calls,
+    write_results,
+)
+
+BENCH_PASSWORD = "bench-password"
+
+
+def load_app(workdir):
+    """Import ``server`` inside ``workdir`` with an isolated catalog copy."""
+    catalog_copy = Path(workdir) / "catalog.db"
+    shutil.copy(REPO_ROOT / "emoji_music_recommender.db", catalog_copy)
+    os.environ.setdefault("CATALOG_PATH", str(catalog_copy))
+    # Every frame should reach the model unless the cache is being measured
+    os.environ.setdefault("MOOD_CACHE_SIZE", "0")
+    # and at full resolution: a deep queue keeps admission control out of the way
+    os.environ.setdefault("DETECT_QUEUE_DEPTH", "100000")
+    os.chdir(workdir)
+    import server
+    return server
+
+
+def run_load(app, make_request, total, concurrency):
+    """Send ``total`` requests from ``concurrency`` threads and summarise them.
+
+    ``make_request`` returns ``True``, ``False`` (an error) or the name of a
+    reduced outcome such as ``"shed"``; those are counted per name and kept
+    out of the latency statistics.
+    """
+    counter = itertools.count()
+
+    def worker(_):
+        client = app.test_client()
+        latencies, errors, reduced = [], 0, {}
+        while next(counter) < total:
+            start = time.perf_counter()
+            ok = make_request(client)
+            elapsed = time.perf_counter() - start
+            if isinstance(ok, str):
+                reduced[ok] = reduced.get(ok, 0) + 1
+                continue
+            latencies.append(elapsed)
+            errors += 0 if ok else 1
+        return latencies, errors, reduced
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies = [latency for result, _, _ in outcomes for latency in result]
+    summary = summarize(latencies, wall, sum(errors for _, errors, _ in outcomes))
+    for _, _, reduced in outcomes:
+        for name, count in reduced.items():
+            summary[name] = summary.get(name, 0) + count
+    return summary
+
+
+def _json_ok(response):
+    if response.status_code != 200:
+        return False
+    data = response.get_json(silent=True)
+    return isinstance(data, dict) and "error" not in data
+
+
+def _detect_outcome(response):
+    """Like ``_json_ok``, but names shed and degraded answers from admission control."""
+    data = response.get_json(silent=True)
+    if response.status_code == 503 and isinstance(data, dict) and data.get("busy"):
+        return "shed"
+    if _json_ok(response) and data.get("degraded"):
+        return "degraded"
+    return _json_ok(response)
+
+
+def detect_scenarios(resolutions, formats, frames_per_scenario=8):
+    """``detect_mood`` request factories keyed by scenario name."""
+    scenarios = {}
+    for res in resolutions:
+        width, height = RESOLUTIONS[res]
+        for fmt in formats:
+            payloads = [encode_frame(synthetic_face(width, height, seed), fmt)
+                        for seed in range(frames_per_scenario)]
+            rotation = itertools.cycle(payloads)
+
+            def request(client, rotation=rotation):
+                body, content_type = next(rotation)
+                return _detect_outcome(client.post("/detect_mood", data=body, content_type=content_type))
+
+            size = int(np.mean([len(body) for body, _ in payloads]))
+            scenarios[f"detect_mood:{fmt}:{res}"] = (request, {"payload_bytes": size})
+    return scenarios
+
+
+def route_scenarios(server):
+    """Request factories for the emoji and auth routes."""
+    if server.users.get_user("bench@example.com") is None:
+        server.users.add_user("bench@example.com", BENCH_PASSWORD)
+    emojis = itertools.cycle(["😊", "😢", "😡", "😲", "🙂"])
+    emails = (f"bench-{os.getpid()}-{i}@example.com" for i in itertools.count())
+
+    def emoji(client):
+        return _json_ok(client.post("/emoji_recommend", json={"emoji": next(emojis)}))
+
+    def login(client):
+        response = client.post("/login", data={"email": "bench@example.com",
+                                                "password": BENCH_PASSWORD})
+        return response.status_code == 302 and response.headers["Location"].endswith("/recommend")
+
+    def signup(client):
+        response = client.post("/signup", data={"email": next(emails),
+                                                 "password": BENCH_PASSWORD})
+        return response.status_code == 302
+
+    return {"emoji_recommend": (emoji, {}), "login": (login, {}), "signup": (signup, {})}
+
+
+def stage_breakdown(server, resolutions, repeat):
+    """Time each stage of the detection path in isolation."""
+    stages = {}
+    try:
+        from face_detection import EmotionPipeline
+        pipeline = EmotionPipeline(backend=server.FACE_DETECTOR,
+                                   detection_width=server.FACE_DETECTION_WIDTH)
+    except Exception as e:  # the vision stack may not be installed
+        pipeline = None
+        stages["skipped"] = f"detect/classify: {type(e).__name__}: {e}"
+
+    emotions = {"happy": 0.6, "neutral": 0.3, "surprise": 0.1}
+    songs = server.recommender.recommend(emotions, k=4)
+    stages["recommend"] = summarize(time_calls(lambda: server.recommender.recommend(emotions, k=4), repeat))
+    stages["serialize"] = summarize(time_calls(
+        lambda: json.dumps({"mood": "happy", "songs": songs, "emotions": emotions}), repeat))
+    if pipeline is not None:
+        crops = np.zeros((1, 64, 64), dtype=np.float32)
+        stages["classify"] = summarize(time_calls(lambda: pipeline.classifier._classify_emotions(crops), repeat))
+
+    for res in resolutions:
+        width, height = RESOLUTIONS[res]
+        frame = synthetic_face(width, height)
+        png = cv2.imencode(".png", frame)[1].tobytes()
+        data_url = "data:image/png;base64," + base64.b64encode(png).decode()
+        jpeg = encode_frame(frame, "jpeg")[0]
+        webp = encode_frame(frame, "webp")[0]
+        stages[f"decode_base64:{res}"] = summarize(time_calls(
+            lambda: base64.b64decode(data_url.split(",")[1]), repeat))
+        for name, body in (("png", png), ("jpeg", jpeg), ("webp", webp)):
+            stages[f"imdecode_{name}:{res}"] = summarize(time_calls(
+                lambda body=body: cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR), repeat))
+        if pipeline is not None:
+            stages[f"detect:{res}"] = summarize(time_calls(lambda: pipeline.find_faces(frame), repeat))
+            stages[f"detect_classify:{res}"] = summarize(time_calls(
+                lambda: pipeline.detect_emotions(frame), repeat))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the server endpoints.")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--resolutions", nargs="+", choices=sorted(RESOLUTIONS),
+                        default=list(RESOLUTIONS))
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=list(FORMATS))
+    parser.add_argument("--stage-repeat", type=int, default=50, help="iterations per stage timing")
+    parser.add_argument("--skip-detect", action="store_true", help="skip the vision scenarios")
+    parser.add_argument("--out", help="result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    out = Path(args.out).resolve() if args.out else None
+    workdir = tempfile.mkdtemp(prefix="melobot-bench-")
+    server = load_app(workdir)
+
+    scenarios = route_scenarios(server)
+    if not args.skip_detect:
+        scenarios.update(detect_scenarios(args.resolutions, args.formats))
+
+    results = {"config": vars(args), "endpoints": {}, "stages": {}}
+    for name, (request, info) in scenarios.items():
+        for level in args.concurrency:
+            summary = run_load(server.app, request, args.requests, level)
+            summary.update(info)
+            results["endpoints"][f"{name}@c{level}"] = summary
+            print(f"{name:<32} c={level:<3} p50={summary.get('p50_ms')}ms "
+                  f"p99={summary.get('p99_ms')}ms rps={summary.get('throughput_rps')} "
+                  f"errors={summary['errors']} shed={summary.get('shed', 0)} "
+                  f"degraded={summary.get('degraded', 0)}")
+
+    if not args.skip_detect:
+        results["stages"] = stage_breakdown(server, args.resolutions, args.stage_repeat)
+        for name, summary in results["stages"].items():
+            if isinstance(summary, dict):
+                print(f"stage {name:<28} p50={summary['p50_ms']}ms p99={summary['p99_ms']}ms")
+
+    path = write_results("server", results, out)
+    print(f"Results written to {path}")
+    if server.detector is not None:
+        server.detector.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Shared helpers for the benchmark scripts: synthetic frames, latency
+statistics and machine-readable result files.
+"""
+import base64
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+
+RESOLUTIONS = {
+    "240p": (320, 240),
+    "480p": (640, 480),
+    "720p": (1280, 720),
+}
+
+# name -> content type of the request body (see ``encode_frame``)
+FORMATS = {
+    "png-dataurl": "application/json",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+
+def synthetic_face(width, height, seed=0):
+    """A deterministic, roughly face-shaped test frame (BGR)."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(90, 140, (height, width, 3), dtype=np.uint8)
+    cx, cy = width // 2, height // 2
+    rx, ry = width // 7, height // 4
+    cv2.ellipse(frame, (cx, cy), (rx, ry), 0, 0, 360, (140, 170, 215), -1)
+    for dx in (-rx // 2, rx // 2):
+        cv2.circle(frame, (cx + dx, cy - ry // 4), max(2, rx // 8), (40, 40, 40), -1)
+    cv2.ellipse(frame, (cx, cy + ry // 2), (rx // 2, ry // 6), 0, 0, 180, (60, 60, 150), 3)
+    return frame
+
+
+def encode_frame(frame, fmt, quality=80):
+    """Return ``(body bytes, content type)`` for a /detect_mood request."""
+    if fmt == "png-dataurl":
+        png = cv2.imencode(".png", frame)[1].tobytes()
+        body = json.dumps({"image": "data:image/png;base64," + base64.b64encode(png).decode()})
+        return body.encode(), FORMATS[fmt]
+    if fmt == "jpeg":
+        return cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes(), FORMATS[fmt]
+    if fmt == "webp":
+        return cv2.imencode(".webp", frame, [cv2.IMWRITE_WEBP_QUALITY, quality])[1].tobytes(), FORMATS[fmt]
+    raise ValueError(f"Unknown format '{fmt}'")
+
+
+def summarize(latencies, wall_time=None, errors=0):
+    """Latency percentiles (milliseconds) and throughput for a run."""
+    samples = np.asarray(latencies, dtype=np.float64) * 1000.0
+    if not len(samples):
+        return {"count": 0, "errors": errors}
+    summary = {
+        "count": int(len(samples)),
+        "errors": int(errors),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+    if wall_time:
+        summary["throughput_rps"] = round(len(samples) / wall_time, 2)
+    return summary
+
+
+def time_calls(fn, repeat, warmup=3):
+    """Call ``fn`` ``repeat`` times and return per-call latencies in seconds."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def environment():
+    """Enough context to tell two result files apart."""
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def write_results(name, results, out=None):
+    """Write ``results`` as JSON and return the path."""
+    path = Path(out) if out else RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"benchmark": name, "created_at": time.time(), "environment": environment(),
+               "results": results}
+    path.write_text(json.dumps(payload, indent=2))
+    return path
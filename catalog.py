@@ -0,0 +1,515 @@
+"""
+SQLite song catalog shared by the web server and the CLI recommender.
+
+Both entry points read songs from the same store (by default the CLI's
+``emoji_music_recommender.db``):
+
+- ``songs``                the tracks themselves
+- ``emojis``               emojis offered by the CLI
+- ``emoji_song_mappings``  emoji -> song relations (indexed by emoji_id)
+- ``song_moods``           mood -> song relations with a dense per-mood
+                           position, so a random sample is a handful of
+                           primary-key lookups instead of a scan
+- ``song_emotions``        optional per-song emotion profile over the FER
+                           emotions, used by the ranking engine
+
+The schema is versioned with ``PRAGMA user_version`` (see ``MIGRATIONS``),
+so opening an up-to-date database costs one pragma read. Connections are
+pooled in WAL mode and reused across threads. Mood counts and sampled
+rows are kept in a small in-process cache that is dropped whenever the
+catalog is written, either through this module or by another connection
+(detected with ``PRAGMA data_version``).
+"""
+import random
+import threading
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import db
+
+# Default catalog location: the database the CLI has always used
+CATALOG_PATH = Path(__file__).with_name("emoji_music_recommender.db")
+
+# Initial data used to seed the catalog on first run
+INITIAL_EMOJIS = [
+    (1, "Happy", "😊"),
+    (2, "Sad",   "😢"),
+    (3, "Angry", "😠"),
+    (4, "Love",  "😍"),
+]
+
+INITIAL_SONGS = [
+    # id, author, movie_name/description, music_producer/fullLyrics, name, singer
+    (1, "John Williams", "A New Hope", "London Symphony Orchestra", "Star Wars Theme", "London Symphony Orchestra"),
+    (2, "Ludovico Einaudi", "Night", "Decca Records", "Nuvole Bianche", "Ludovico Einaudi"),
+    (3, "Adele", "21", "Paul Epworth", "Rolling in the Deep", "Adele"),
+    (4, "Pharrell Williams", "Happy", "Pharrell Williams", "Happy", "Pharrell Williams"),
+    (5, "Bill Withers", "+", "Bill Withers", "Ain't No Sunshine", "Bill Withers"),
+]
+
+# Mapping of emoji_id to song IDs
+# e.g., the "happy" emoji maps to songs 4 and 1; the "sad" emoji maps to songs 2 and 5, etc.
+INITIAL_EMOJI_SONG_MAP = {
+    1: [4, 1],  # Happy maps to "Happy" and "Star Wars Theme"
+    2: [2, 5],  # Sad maps to "Nuvole Bianche" and "Ain't No Sunshine"
+    3: [3],     # Angry maps to "Rolling in the Deep"
+    4: [2, 4],  # Love maps to "Nuvole Bianche" and "Happy"
+}
+
+# Songs recommended by the web app for each detected mood
+INITIAL_MOOD_SONGS = {
+    "happy": [
+        {"name": "Happy", "singer": "Pharrell Williams", "spotify_url": "https://open.spotify.com/track/60nZcImufyMA1MKQY3dcCH"},
+        {"name": "Uptown Funk", "singer": "Bruno Mars", "spotify_url": "https://open.spotify.com/track/32OlwWuMpZ6b0aN2RZOeMS"},
+        {"name": "Can’t Stop the Feeling", "singer": "Justin Timberlake", "spotify_url": "https://open.spotify.com/track/6JV2JOEocMgcZxYSZelKcc"},
+        {"name": "Good Life", "singer": "OneRepublic", "spotify_url": "https://open.spotify.com/track/6OtCIsQZ64Vs1EbzztvAv4"},
+        {"name": "Shake It Off", "singer": "Taylor Swift", "spotify_url": "https://open.spotify.com/track/5xTtaWoae3wi06K5WfVUUH"},
+        {"name": "I Gotta Feeling", "singer": "Black Eyed Peas", "spotify_url": "https://open.spotify.com/track/4bHsxqR3GMrXTxEPLuK5ue"},
+        {"name": "On Top of the World", "singer": "Imagine Dragons", "spotify_url": "https://open.spotify.com/track/6KuHjfXHkfnIjdmcIvt9r0"},
+        {"name": "Best Day of My Life", "singer": "American Authors", "spotify_url": "https://open.spotify.com/track/5Hroj5K7vLpIG4FNCRIjbP"},
+        {"name": "Sugar", "singer": "Maroon 5", "spotify_url": "https://open.spotify.com/track/494OU6M7NOf4ICYb4zWCf5"},
+        {"name": "Firework", "singer": "Katy Perry", "spotify_url": "https://open.spotify.com/track/4jCj0C5eaM3yTQpYJ1dHzT"},
+    ],
+    "sad": [
+        {"name": "Someone Like You", "singer": "Adele", "spotify_url": "https://open.spotify.com/track/4kflIGfjdZJW4ot2ioixTB"},
+        {"name": "Let Her Go", "singer": "Passenger", "spotify_url": "https://open.spotify.com/track/2jyjhRf6DVbMPU5zxagN2h"},
+        {"name": "Fix You", "singer": "Coldplay", "spotify_url": "https://open.spotify.com/track/7LVHVU3tWfcxj5aiPFEW4Q"},
+        {"name": "Stay With Me", "singer": "Sam Smith", "spotify_url": "https://open.spotify.com/track/3jjujdWJ72nww5eGnfs2E7"},
+        {"name": "When I Was Your Man", "singer": "Bruno Mars", "spotify_url": "https://open.spotify.com/track/0nJW01T7XtvILxQgC5J7Wh"},
+        {"name": "All I Want", "singer": "Kodaline", "spotify_url": "https://open.spotify.com/track/0MlTOiC5ZYKFGeZ8h3D4rd"},
+        {"name": "Say Something", "singer": "A Great Big World", "spotify_url": "https://open.spotify.com/track/2aBxt229cbLDOvtL7Xbb9x"},
+        {"name": "The Night We Met", "singer": "Lord Huron", "spotify_url": "https://open.spotify.com/track/0sQLhU6sAuQG2iJQyF4kOx"},
+        {"name": "Jealous", "singer": "Labrinth", "spotify_url": "https://open.spotify.com/track/3dT4hzxwPjKYQxDq2AvivO"},
+        {"name": "With or Without You", "singer": "U2", "spotify_url": "https://open.spotify.com/track/5J4PZby3pi0wfQWmVHg6Y7"},
+    ],
+    "angry": [
+        {"name": "In The End", "singer": "Linkin Park", "spotify_url": "https://open.spotify.com/track/60a0Rd6pjrkxjPbaKzXjfq"},
+        {"name": "Break Stuff", "singer": "Limp Bizkit", "spotify_url": "https://open.spotify.com/track/5UoFrZbjWKQUn0KPLWgwhT"},
+        {"name": "Killing In The Name", "singer": "RATM", "spotify_url": "https://open.spotify.com/track/4u7EnebtmKWzUH433cf5Qv"},
+        {"name": "Smells Like Teen Spirit", "singer": "Nirvana", "spotify_url": "https://open.spotify.com/track/5ghIJDpPoe3CfHMGu71E6T"},
+        {"name": "Duality", "singer": "Slipknot", "spotify_url": "https://open.spotify.com/track/6QgjcU0zLnzq5OrUoSZ3OK"},
+        {"name": "Down With The Sickness", "singer": "Disturbed", "spotify_url": "https://open.spotify.com/track/2DlHlPMa4M17kufBvI2lEN"},
+        {"name": "Enter Sandman", "singer": "Metallica", "spotify_url": "https://open.spotify.com/track/5sICkBXVmaCQk5aISGR3x1"},
+        {"name": "Bulls on Parade", "singer": "RATM", "spotify_url": "https://open.spotify.com/track/4oN6KR2hAm5JTYo5kxv8aD"},
+        {"name": "Bodies", "singer": "Drowning Pool", "spotify_url": "https://open.spotify.com/track/5r6Vi8ghsl7W95Y0UHMgCy"},
+        {"name": "Faint", "singer": "Linkin Park", "spotify_url": "https://open.spotify.com/track/5w3slHyJp3ihX5mymXy4pM"},
+    ],
+    "neutral": [
+        {"name": "Shape of You", "singer": "Ed Sheeran", "spotify_url": "https://open.spotify.com/track/7qiZfU4dY1lWllzX7mPBI3"},
+        {"name": "Counting Stars", "singer": "OneRepublic", "spotify_url": "https://open.spotify.com/track/2tpWsVSb9UEmDRxAl1zhX1"},
+        {"name": "Rolling in the Deep", "singer": "Adele", "spotify_url": "https://open.spotify.com/track/4OSBTYWVwsQhGLF9NHvIbR"},
+        {"name": "Perfect", "singer": "Ed Sheeran", "spotify_url": "https://open.spotify.com/track/0tgVpDi06FyKpA1z0VMD4v"},
+        {"name": "Photograph", "singer": "Ed Sheeran", "spotify_url": "https://open.spotify.com/track/1HNkqx9Ahdgi1Ixy2xkKkL"},
+        {"name": "Hall of Fame", "singer": "The Script", "spotify_url": "https://open.spotify.com/track/0jQpzzUwC8FrQ1Z21aWztN"},
+        {"name": "Cheap Thrills", "singer": "Sia", "spotify_url": "https://open.spotify.com/track/4pNApnaUWAL2J4KO2eqokq"},
+        {"name": "Stay", "singer": "Rihanna", "spotify_url": "https://open.spotify.com/track/2gZUPNdnz5Y45eiGxpHGSc"},
+        {"name": "A Sky Full of Stars", "singer": "Coldplay", "spotify_url": "https://open.spotify.com/track/2sSyjEshk5U1S4nTbB4ShJ"},
+        {"name": "Memories", "singer": "Maroon 5", "spotify_url": "https://open.spotify.com/track/2NmsngXHeC1GQ9wWrzhOMf"},
+    ],
+    "surprise": [
+        {"name": "Believer", "singer": "Imagine Dragons", "spotify_url": "https://open.spotify.com/track/0pqnGHJpmpxLKifKRmU6WP"},
+        {"name": "Thunder", "singer": "Imagine Dragons", "spotify_url": "https://open.spotify.com/track/1zB4vmk8tFRmM9UULNzbLB"},
+        {"name": "Stronger", "singer": "Kanye West", "spotify_url": "https://open.spotify.com/track/5D4cdSZ6f3j2cGl9LJZNlU"},
+        {"name": "Titanium", "singer": "David Guetta", "spotify_url": "https://open.spotify.com/track/45wXjjX9g4BTQoyKp7jGxm"},
+        {"name": "Wake Me Up", "singer": "Avicii", "spotify_url": "https://open.spotify.com/track/0nrRP2bk19rLc0orkWPQk2"},
+        {"name": "Fireflies", "singer": "Owl City", "spotify_url": "https://open.spotify.com/track/2VxeLyX666F8uXCJ0dZF8B"},
+        {"name": "Radioactive", "singer": "Imagine Dragons", "spotify_url": "https://open.spotify.com/track/4G8gkOterJn0Ywt6uhqbhp"},
+        {"name": "We Found Love", "singer": "Rihanna", "spotify_url": "https://open.spotify.com/track/4KBeYlgkHhGXlDUl9RrY5e"},
+        {"name": "On The Floor", "singer": "Jennifer Lopez", "spotify_url": "https://open.spotify.com/track/2KsP6tYLJlTBvSUxnwlVWa"},
+        {"name": "Stronger (What Doesn’t Kill You)", "singer": "Kelly Clarkson", "spotify_url": "https://open.spotify.com/track/7o7E1r7hMaS8mx3v0xkhOm"},
+    ]
+}
+
+
+SONG_COLUMNS = ("id", "name", "singer", "spotify_url")
+
+# Emotion labels produced by FER, in classifier order
+EMOTIONS = ("angry", "disgust", "fear", "happy", "sad", "surprise", "neutral")
+
+
+def connect(path):
+    """Open a catalog connection tuned for concurrent readers."""
+    return db.connect(path)
+
+
+def create_schema(conn):
+    """Create catalog tables and indexes, upgrading older CLI databases in place.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    c = conn.cursor()
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS emojis (
+            emoji_id INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            emoji TEXT NOT NULL
+        )
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS songs (
+            id INTEGER PRIMARY KEY,
+            author TEXT,
+            movie_name TEXT,
+            music_producer TEXT,
+            name TEXT,
+            singer TEXT,
+            youtube_url TEXT,
+            spotify_url TEXT
+        )
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS emoji_song_mappings (
+            emoji_id INTEGER,
+            song_id INTEGER,
+            FOREIGN KEY (emoji_id) REFERENCES emojis(emoji_id),
+            FOREIGN KEY (song_id) REFERENCES songs(id)
+        )
+        """
+    )
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS song_moods (
+            mood TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            song_id INTEGER NOT NULL REFERENCES songs(id),
+            PRIMARY KEY (mood, position)
+        ) WITHOUT ROWID
+        """
+    )
+    c.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS song_emotions (
+            song_id INTEGER PRIMARY KEY REFERENCES songs(id),
+            {", ".join(f"{emotion} REAL NOT NULL DEFAULT 0" for emotion in EMOTIONS)}
+        )
+        """
+    )
+
+    # Databases created by older versions of the CLI lack the URL columns
+    columns = {row[1] for row in c.execute("PRAGMA table_info(songs)")}
+    for column in ("youtube_url", "spotify_url"):
+        if column not in columns:
+            c.execute(f"ALTER TABLE songs ADD COLUMN {column} TEXT")
+
+    create_indexes(conn)
+
+
+INDEXES = {
+    "idx_emoji_song_mappings_emoji": "emoji_song_mappings (emoji_id, song_id)",
+    "idx_song_moods_song": "song_moods (song_id, mood)",
+    "idx_songs_name_singer": "songs (name, singer)",
+}
+
+
+def create_indexes(conn):
+    """Secondary indexes used by lookups (kept separate so bulk loads can defer them)."""
+    for name, target in INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def drop_indexes(conn):
+    """Drop the secondary indexes before a bulk load; ``create_indexes`` rebuilds them."""
+    for name in INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def seed(conn):
+    """Insert the initial emojis, songs and mappings into empty tables.
+
+    Like ``create_schema`` this leaves committing to the caller.
+    """
+    c = conn.cursor()
+    if c.execute("SELECT COUNT(*) FROM emojis").fetchone()[0] == 0:
+        c.executemany(
+            "INSERT INTO emojis (emoji_id, description, emoji) VALUES (?, ?, ?)",
+            INITIAL_EMOJIS,
+        )
+
+    seeded_songs = c.execute("SELECT COUNT(*) FROM songs").fetchone()[0] == 0
+    if seeded_songs:
+        c.executemany(
+            "INSERT INTO songs (id, author, movie_name, music_producer, name, singer)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            INITIAL_SONGS,
+        )
+
+    # The sample mappings refer to the sample songs' ids; in a catalog that
+    # already had songs (e.g. an unversioned import) those ids are other songs
+    if seeded_songs and c.execute("SELECT COUNT(*) FROM emoji_song_mappings").fetchone()[0] == 0:
+        c.executemany(
+            "INSERT INTO emoji_song_mappings (emoji_id, song_id) VALUES (?, ?)",
+            [
+                (emoji_id, song_id)
+                for emoji_id, song_ids in INITIAL_EMOJI_SONG_MAP.items()
+                for song_id in song_ids
+            ],
+        )
+
+    if c.execute("SELECT COUNT(*) FROM song_moods").fetchone()[0] == 0:
+        for mood, songs in INITIAL_MOOD_SONGS.items():
+            for song in songs:
+                song_id = upsert_song(conn, song["name"], song["singer"],
+                                      spotify_url=song["spotify_url"])
+                append_mood(conn, mood, song_id)
+
+
+def upsert_song(conn, name, singer, **details):
+    """Return the id of the song called ``name`` by ``singer``, inserting or updating it."""
+    details = {k: v for k, v in details.items() if v is not None}
+    row = conn.execute(
+        "SELECT id FROM songs WHERE name = ? AND singer = ?", (name, singer)
+    ).fetchone()
+    if row is None:
+        columns = ["name", "singer", *details]
+        cur = conn.execute(
+            f"INSERT INTO songs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            (name, singer, *details.values()),
+        )
+        return cur.lastrowid
+    if details:
+        assignments = ", ".join(f"{column} = ?" for column in details)
+        conn.execute(f"UPDATE songs SET {assignments} WHERE id = ?", (*details.values(), row[0]))
+    return row[0]
+
+
+def append_mood(conn, mood, song_id):
+    """Tag ``song_id`` with ``mood`` at the next free position for that mood."""
+    if conn.execute(
+        "SELECT 1 FROM song_moods WHERE song_id = ? AND mood = ?", (song_id, mood)
+    ).fetchone():
+        return
+    conn.execute(
+        "INSERT INTO song_moods (mood, position, song_id)"
+        " SELECT ?, COALESCE(MAX(position) + 1, 0), ? FROM song_moods WHERE mood = ?",
+        (mood, song_id, mood),
+    )
+
+
+def set_emotions(conn, song_id, emotions):
+    """Store the emotion profile (a dict keyed by FER emotion) of ``song_id``."""
+    conn.execute(
+        f"INSERT OR REPLACE INTO song_emotions (song_id, {', '.join(EMOTIONS)})"
+        f" VALUES (?, {', '.join('?' * len(EMOTIONS))})",
+        (song_id, *(float(emotions.get(emotion, 0.0)) for emotion in EMOTIONS)),
+    )
+
+
+def create_user_table(conn):
+    """Accounts of the CLI recommender, which keeps them in the catalog database."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            age INTEGER,
+            gender TEXT
+        )
+        """
+    )
+
+
+# Schema migrations in order; ``PRAGMA user_version`` records how many have
+# been applied. Only ever append new steps. Every step is idempotent, so
+# databases created before versioning (user_version 0) upgrade cleanly.
+MIGRATIONS = (
+    create_schema,      # 1: catalog tables, URL columns and indexes
+    seed,               # 2: sample emojis, songs and mood tags
+    create_user_table,  # 3: CLI accounts
+)
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations in one transaction; returns the schema version.
+
+    On an up-to-date database this is a single ``PRAGMA`` read, so it is
+    cheap to call on every start.
+    """
+    if schema_version(conn) >= len(MIGRATIONS):
+        return schema_version(conn)
+    # IMMEDIATE takes the write lock up front so concurrent first starts
+    # run the migrations one after the other
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for step in MIGRATIONS[schema_version(conn):]:
+            step(conn)
+        conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(MIGRATIONS)
+
+
+class Catalog:
+    """Thread-safe access to the song catalog with a warm read cache."""
+
+    def __init__(self, path=CATALOG_PATH, cache_size=4096):
+        self.path = Path(path)
+        self.cache_size = cache_size
+        self.version = 0  # bumped every time cached reads are invalidated
+        self._pool = db.ConnectionPool(self.path)
+        self._data_versions = weakref.WeakKeyDictionary()  # connection -> PRAGMA data_version
+        self._lock = threading.Lock()
+        self._mood_counts = {}
+        self._rows = OrderedDict()  # (mood, position) -> song dict
+        self._songs = OrderedDict()  # song id -> song dict
+
+    # -- connections and cache ------------------------------------------------
+
+    def connection(self):
+        """Return this thread's connection, opening it on first use."""
+        return self._pool.connection()
+
+    def _reader(self):
+        """Connection for reads; drops the cache if another connection committed."""
+        conn = self.connection()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        seen = self._data_versions.get(conn)
+        if data_version != seen:
+            if seen is not None:
+                self.invalidate()
+            self._data_versions[conn] = data_version
+        return conn
+
+    def invalidate(self):
+        """Forget all cached reads."""
+        with self._lock:
+            self._mood_counts.clear()
+            self._rows.clear()
+            self._songs.clear()
+            self.version += 1
+
+    def ensure_schema(self):
+        migrate(self.connection())
+        self.invalidate()
+
+    def close(self):
+        """Close the pooled connections."""
+        self._pool.close()
+
+    # -- reads ----------------------------------------------------------------
+
+    def mood_count(self, mood):
+        conn = self._reader()
+        count = self._mood_counts.get(mood)
+        if count is None:
+            count = conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM song_moods WHERE mood = ?", (mood,)
+            ).fetchone()[0]
+            with self._lock:
+                self._mood_counts[mood] = count
+        return count
+
+    def moods(self):
+        """All moods that have at least one song."""
+        conn = self._reader()
+        return [row[0] for row in conn.execute("SELECT DISTINCT mood FROM song_moods")]
+
+    def sample_mood(self, mood, k=4):
+        """Return up to ``k`` random songs tagged with ``mood``."""
+        count = self.mood_count(mood)
+        if count == 0:
+            return []
+        positions = random.sample(range(count), min(k, count))
+
+        songs, missing = {}, []
+        with self._lock:
+            for position in positions:
+                song = self._rows.get((mood, position))
+                if song is None:
+                    missing.append(position)
+                else:
+                    self._rows.move_to_end((mood, position))
+                    songs[position] = song
+
+        if missing:
+            version = self.version
+            conn = self.connection()
+            rows = conn.execute(
+                "SELECT m.position, s.id, s.name, s.singer, s.spotify_url"
+                " FROM song_moods m JOIN songs s ON s.id = m.song_id"
+                f" WHERE m.mood = ? AND m.position IN ({', '.join('?' * len(missing))})",
+                (mood, *missing),
+            ).fetchall()
+            with self._lock:
+                for row in rows:
+                    song = dict(zip(SONG_COLUMNS, tuple(row)[1:]))
+                    songs[row[0]] = song
+                    if version == self.version:
+                        self._rows[(mood, row[0])] = song
+                while len(self._rows) > self.cache_size:
+                    self._rows.popitem(last=False)
+
+        return [songs[position] for position in positions if position in songs]
+
+    def get_songs(self, song_ids):
+        """Return songs for ``song_ids`` in the same order, skipping unknown ids."""
+        conn = self._reader()
+        songs, missing = {}, []
+        with self._lock:
+            for song_id in song_ids:
+                song = self._songs.get(song_id)
+                if song is None:
+                    missing.append(song_id)
+                else:
+                    self._songs.move_to_end(song_id)
+                    songs[song_id] = song
+
+        if missing:
+            version = self.version
+            rows = conn.execute(
+                f"SELECT {', '.join(SONG_COLUMNS)} FROM songs"
+                f" WHERE id IN ({', '.join('?' * len(missing))})",
+                missing,
+            ).fetchall()
+            with self._lock:
+                for row in rows:
+                    song = dict(zip(SONG_COLUMNS, tuple(row)))
+                    songs[song["id"]] = song
+                    if version == self.version:
+                        self._songs[song["id"]] = song
+                while len(self._songs) > self.cache_size:
+                    self._songs.popitem(last=False)
+
+        return [songs[song_id] for song_id in song_ids if song_id in songs]
+
+    def mood_tags(self):
+        """Iterate over ``(song_id, mood)`` pairs for every tagged song."""
+        return self._reader().execute("SELECT song_id, mood FROM song_moods ORDER BY song_id")
+
+    def emotion_profiles(self):
+        """Iterate over ``(song_id, profile)`` for songs with an explicit emotion profile."""
+        rows = self._reader().execute(f"SELECT song_id, {', '.join(EMOTIONS)} FROM song_emotions")
+        for row in rows:
+            yield row[0], tuple(row)[1:]
+
+    # -- writes ---------------------------------------------------------------
+
+    def add_song(self, name, singer, moods=(), emoji_ids=(), emotions=None, **details):
+        """Insert or update a song and tag it with moods, emojis and an emotion profile."""
+        conn = self.connection()
+        with conn:
+            song_id = upsert_song(conn, name, singer, **details)
+            if emotions:
+                set_emotions(conn, song_id, emotions)
+            for mood in moods:
+                append_mood(conn, mood, song_id)
+            conn.executemany(
+                "INSERT INTO emoji_song_mappings (emoji_id, song_id) SELECT ?, ?"
+                " WHERE NOT EXISTS (SELECT 1 FROM emoji_song_mappings"
+                " WHERE emoji_id = ? AND song_id = ?)",
+                [(emoji_id, song_id, emoji_id, song_id) for emoji_id in emoji_ids],
+            )
+        self.invalidate()
+        return song_id
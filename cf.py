@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Implicit-feedback matrix factorisation (ALS) for personalised recommendations.
+
+The model follows Hu, Koren & Volinsky's implicit ALS: every logged
+interaction contributes a confidence ``1 + alpha * weight`` that the user
+likes the song, and user and item factors are solved alternately in closed
+form with NumPy. Training is an offline step; at serving time the
+recommender only needs one dot product between the user's factor vector and
+each candidate song's factors.
+
+Usage:
+
+  $ python3 cf.py train    # fit from scratch on all logged interactions
+  $ python3 cf.py update   # fold in users/items with interactions since the last run
+
+Both commands read ``database/users.db`` and write ``database/cf_model.npz``
+by default; a running server picks up the new file without a restart
+(see ``ReloadingModel``).
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from feedback import load_interactions
+
+USERS_DB_PATH = Path("database/users.db")
+MODEL_PATH = Path("database/cf_model.npz")
+
+
+def _group(keys, n):
+    """CSR-style ``(order, indptr)`` grouping interaction rows by ``keys``."""
+    order = np.argsort(keys, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return order, indptr
+
+
+class ImplicitALS:
+    """Alternating least squares on implicit feedback."""
+
+    def __init__(self, factors=32, regularization=0.1, alpha=20.0, iterations=10, seed=0):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.seed = seed
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.item_ids = np.empty(0, dtype=np.int64)
+        self.user_factors = np.empty((0, factors), dtype=np.float32)
+        self.item_factors = np.empty((0, factors), dtype=np.float32)
+        self.last_rowid = 0
+        self._user_index = {}
+        self._item_index = {}
+
+    # -- training -------------------------------------------------------------
+
+    def _solve(self, fixed, rows, confidence, gram=None):
+        """Closed-form factors for one user/item given the other side's factors."""
+        if gram is None:
+            gram = fixed.T @ fixed
+        Y = fixed[rows]
+        A = gram + (Y.T * (confidence - 1.0)) @ Y
+        A[np.diag_indices_from(A)] += self.regularization
+        return np.linalg.solve(A, Y.T @ confidence)
+
+    def _sweep(self, target, fixed, keys, others, confidence):
+        """Re-solve every row of ``target`` against ``fixed``."""
+        order, indptr = _group(keys, len(target))
+        gram = fixed.T @ fixed
+        reg = self.regularization * np.eye(self.factors)
+        for row in range(len(target)):
+            members = order[indptr[row]:indptr[row + 1]]
+            if not len(members):
+                target[row] = 0
+                continue
+            Y = fixed[others[members]]
+            c = confidence[members]
+            A = gram + (Y.T * (c - 1.0)) @ Y + reg
+            target[row] = np.linalg.solve(A, Y.T @ c)
+
+    @staticmethod
+    def _aggregate(users, items, weights):
+        """Sum the weights of repeated (user, item) pairs."""
+        pairs = np.stack([users, items], axis=1)
+        unique, inverse = np.unique(pairs, axis=0, return_inverse=True)
+        return unique[:, 0], unique[:, 1], np.bincount(inverse.ravel(), weights=weights)
+
+    def fit(self, user_ids, song_ids, weights):
+        """Train from scratch on raw user/song id arrays."""
+        self.user_ids, users = np.unique(user_ids, return_inverse=True)
+        self.item_ids, items = np.unique(song_ids, return_inverse=True)
+        users, items, totals = self._aggregate(users.ravel(), items.ravel(), weights)
+        confidence = 1.0 + self.alpha * totals
+
+        rng = np.random.default_rng(self.seed)
+        scale = 0.01
+        U = rng.normal(0, scale, (len(self.user_ids), self.factors))
+        V = rng.normal(0, scale, (len(self.item_ids), self.factors))
+        for _ in range(self.iterations):
+            self._sweep(U, V, users, items, confidence)
+            self._sweep(V, U, items, users, confidence)
+
+        self.user_factors = U.astype(np.float32)
+        self.item_factors = V.astype(np.float32)
+        self._reindex()
+        return self
+
+    def partial_fit(self, user_ids, song_ids, weights):
+        """Fold in the complete histories of new or changed users and songs.
+
+        Item factors of unseen songs are solved from known users first, then
+        every user in the batch is re-solved against the (fixed) item factors.
+        Existing factors of other users and items are left untouched.
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        song_ids = np.asarray(song_ids, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(user_ids):
+            # One confidence per (user, song) pair, as in ``fit``
+            user_ids, song_ids, weights = self._aggregate(user_ids, song_ids, weights)
+        U = self.user_factors.astype(np.float64)
+        V = self.item_factors.astype(np.float64)
+
+        new_items = [s for s in np.unique(song_ids) if int(s) not in self._item_index]
+        if new_items:
+            gram = U.T @ U
+            V = np.vstack([V, np.zeros((len(new_items), self.factors))])
+            self.item_ids = np.concatenate([self.item_ids, np.asarray(new_items, dtype=np.int64)])
+            self._reindex()
+            for song_id in new_items:
+                mask = (song_ids == song_id) & np.isin(user_ids, self.user_ids)
+                if mask.any() and len(U):
+                    users = np.array([self._user_index[int(u)] for u in user_ids[mask]])
+                    confidence = 1.0 + self.alpha * weights[mask]
+                    V[self._item_index[int(song_id)]] = self._solve(U, users, confidence, gram)
+
+        gram = V.T @ V
+        for user_id in np.unique(user_ids):
+            mask = user_ids == user_id
+            items = np.array([self._item_index[int(s)] for s in song_ids[mask]])
+            confidence = 1.0 + self.alpha * weights[mask]
+            vector = self._solve(V, items, confidence, gram)
+            row = self._user_index.get(int(user_id))
+            if row is None:
+                U = np.vstack([U, vector])
+                self.user_ids = np.append(self.user_ids, user_id)
+                self._user_index[int(user_id)] = len(U) - 1
+            else:
+                U[row] = vector
+
+        self.user_factors = U.astype(np.float32)
+        self.item_factors = V.astype(np.float32)
+        return self
+
+    def _reindex(self):
+        self._user_index = {int(u): i for i, u in enumerate(self.user_ids)}
+        self._item_index = {int(s): i for i, s in enumerate(self.item_ids)}
+
+    # -- serving --------------------------------------------------------------
+
+    def score(self, user_id, song_ids):
+        """Preference of ``user_id`` for each song (0 for unknown users or songs)."""
+        scores = np.zeros(len(song_ids), dtype=np.float32)
+        row = self._user_index.get(int(user_id)) if user_id is not None else None
+        if row is None:
+            return scores
+        rows = np.array([self._item_index.get(int(s), -1) for s in song_ids])
+        known = rows >= 0
+        if known.any():
+            scores[known] = self.item_factors[rows[known]] @ self.user_factors[row]
+        return scores
+
+    # -- persistence ----------------------------------------------------------
+
+    def save(self, path):
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, user_ids=self.user_ids, item_ids=self.item_ids,
+                     user_factors=self.user_factors, item_factors=self.item_factors,
+                     params=np.array([self.factors, self.regularization, self.alpha,
+                                      self.iterations, self.seed, self.last_rowid]))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        factors, regularization, alpha, iterations, seed, last_rowid = data["params"]
+        model = cls(int(factors), float(regularization), float(alpha), int(iterations), int(seed))
+        model.user_ids = data["user_ids"]
+        model.item_ids = data["item_ids"]
+        model.user_factors = np.ascontiguousarray(data["user_factors"])
+        model.item_factors = np.ascontiguousarray(data["item_factors"])
+        model.last_rowid = int(last_rowid)
+        model._reindex()
+        return model
+
+
+class ReloadingModel:
+    """The model saved at ``path``, reloaded after ``train``/``update`` replace it.
+
+    The file is checked at most every ``check_interval`` seconds. ``score``
+    returns zeros until a model has been trained.
+    """
+
+    def __init__(self, path=MODEL_PATH, check_interval=5.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self.model = None
+        self._identity = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._maybe_reload()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+                identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                if identity == self._identity:
+                    return
+                self.model = ImplicitALS.load(self.path)
+                self._identity = identity
+            except (OSError, ValueError, KeyError):
+                # No model yet, or an unreadable file: keep the current one
+                return
+
+    def score(self, user_id, song_ids):
+        self._maybe_reload()
+        model = self.model
+        if model is None:
+            return np.zeros(len(song_ids), dtype=np.float32)
+        return model.score(user_id, song_ids)
+
+
+# -- Command line -----------------------------------------------------------------
+
+def train(db_path, model_path, **params):
+    conn = sqlite3.connect(db_path)
+    rowids, users, songs, weights = load_interactions(conn)
+    conn.close()
+    if not len(rowids):
+        print("No interactions logged yet.")
+        return None
+    model = ImplicitALS(**params).fit(users, songs, weights)
+    model.last_rowid = int(rowids.max())
+    model.save(model_path)
+    print(f"Trained on {len(rowids)} interactions: "
+          f"{len(model.user_ids)} users, {len(model.item_ids)} songs.")
+    return model
+
+
+def update(db_path, model_path):
+    model = ImplicitALS.load(model_path)
+    conn = sqlite3.connect(db_path)
+    rowids, users, _, _ = load_interactions(conn, since_rowid=model.last_rowid)
+    if not len(rowids):
+        conn.close()
+        print("No new interactions.")
+        return model
+    # Re-solve changed users from their full history
+    _, users, songs, weights = load_interactions(conn, user_ids=np.unique(users).tolist())
+    conn.close()
+    model.partial_fit(users, songs, weights)
+    model.last_rowid = int(rowids.max())
+    model.save(model_path)
+    print(f"Updated {len(np.unique(users))} users from {len(rowids)} new interactions.")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=["train", "update"])
+    parser.add_argument("--db", default=str(USERS_DB_PATH), help="users database with interactions")
+    parser.add_argument("--model", default=str(MODEL_PATH), help="where to store the factors")
+    parser.add_argument("--factors", type=int, default=32)
+    parser.add_argument("--regularization", type=float, default=0.1)
+    parser.add_argument("--alpha", type=float, default=20.0)
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train(args.db, args.model, factors=args.factors, regularization=args.regularization,
+              alpha=args.alpha, iterations=args.iterations)
+    else:
+        update(args.db, args.model)
+
+
+if __name__ == '__main__':
+    main()
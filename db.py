@@ -0,0 +1,113 @@
+"""
+Shared SQLite connection helpers.
+
+``connect`` opens a connection with the pragmas every store in this project
+uses (WAL journaling so readers never block the writer, relaxed fsync, a
+larger page cache and a busy timeout instead of immediate "database is
+locked" errors). ``ConnectionPool`` lends each thread one such connection
+and takes it back when the thread exits, keeping up to ``max_idle`` of them
+open for the next threads, so hot paths skip the connect/close cost and
+reuse SQLite's prepared-statement cache even when every request runs on a
+new thread. Connections are never shared across ``fork``: a forked child
+(e.g. a server worker of a preloaded app) starts with an empty pool.
+"""
+import os
+import sqlite3
+import threading
+import weakref
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # ~16 MB
+)
+
+
+class Connection(sqlite3.Connection):
+    """``sqlite3.Connection`` that supports weak references and attributes."""
+
+
+def connect(path, statement_cache=256, check_same_thread=True):
+    """Open a tuned connection returning ``sqlite3.Row`` rows."""
+    conn = sqlite3.connect(str(path), timeout=5, cached_statements=statement_cache,
+                           check_same_thread=check_same_thread, factory=Connection)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class _Lease:
+    """A thread's hold on a pooled connection; dropped when the thread exits."""
+
+    def __init__(self, pool, conn):
+        self._pool = weakref.ref(pool)
+        self._pid = os.getpid()
+        self.conn = conn
+
+    def __del__(self):
+        pool = self._pool()
+        # Leases copied into a forked child still belong to the parent
+        if pool is not None and self._pid == os.getpid():
+            pool._release(self.conn)
+
+
+class ConnectionPool:
+    """Lends one connection per thread and reuses them after the thread exits."""
+
+    def __init__(self, path, statement_cache=256, max_idle=8):
+        self.path = str(path)
+        self.statement_cache = statement_cache
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._connections = set()  # every open connection, idle or lent
+        self._idle = []
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def connection(self):
+        """Return the calling thread's connection, borrowing one on first use."""
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                # Used by one thread at a time, but not always the same one
+                conn = connect(self.path, self.statement_cache, check_same_thread=False)
+                with self._lock:
+                    self._connections.add(conn)
+            lease = self._local.lease = _Lease(self, conn)
+        return lease.conn
+
+    def _release(self, conn):
+        """Take back a connection from a finished thread."""
+        with self._lock:
+            if conn not in self._connections:
+                return  # the pool was closed meanwhile
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._connections.discard(conn)
+        conn.close()
+
+    def close(self):
+        """Close every connection opened by the pool."""
+        with self._lock:
+            connections, self._connections, self._idle = self._connections, set(), []
+        self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def _forget(self):
+        # Inherited connections belong to the parent: keep them referenced so
+        # they are never closed (or checkpointed) from the child
+        self._inherited = (self._connections, self._idle, self._local)
+        self._lock = threading.RLock()
+        self._connections = set()
+        self._idle = []
+        self._local = threading.local()
@@ -17,142 +17,60 @@ Features:
 Usage:
 
   $ python3 emoji_music_recommender.py
+  $ printf '1\n2\nhappy\n' | python3 emoji_music_recommender.py --batch
+  $ python3 emoji_music_recommender.py --batch queries.txt --output songs.jsonl
 
 The script will prompt you to either sign up or log in. After a successful
 login, you will be shown a list of available emojis. Pick an emoji by its
 ID to see a set of recommended songs associated with it.
 
+With ``--batch`` it runs non-interactively instead: every input line is an
+emoji ID or a mood name (or a JSON object with ``emoji_id`` or ``mood``),
+and one JSON line of recommendations is written per query.
+
 The database is initialised on first run with a few sample records. Feel
-free to modify the `INITIAL_EMOJIS` and `INITIAL_SONGS` dictionaries to
-customise the library of emojis and songs.
+free to modify the `INITIAL_EMOJIS` and `INITIAL_SONGS` lists in
+`catalog.py` to customise the library of emojis and songs. The same catalog
+is used by the web app in `server.py`.
 """
+import argparse
+import json
 import sqlite3
 import getpass
+import sys
 from pathlib import Path
 
+import catalog
+
 # Path to the SQLite database (in the same directory as this script)
 DB_PATH = Path(__file__).with_suffix('.db')
 
-# Initial data used to seed the database on first run
-INITIAL_EMOJIS = [
-    (1, "Happy", "😊"),
-    (2, "Sad",   "😢"),
-    (3, "Angry", "😠"),
-    (4, "Love",  "😍"),
-]
-
-INITIAL_SONGS = [
-    # id, author, movie_name/description, music_producer/fullLyrics, name, singer
-    (1, "John Williams", "A New Hope", "London Symphony Orchestra", "Star Wars Theme", "London Symphony Orchestra"),
-    (2, "Ludovico Einaudi", "Night", "Decca Records", "Nuvole Bianche", "Ludovico Einaudi"),
-    (3, "Adele", "21", "Paul Epworth", "Rolling in the Deep", "Adele"),
-    (4, "Pharrell Williams", "Happy", "Pharrell Williams", "Happy", "Pharrell Williams"),
-    (5, "Bill Withers", "+", "Bill Withers", "Ain't No Sunshine", "Bill Withers"),
-]
-
-# Mapping of emoji_id to song IDs
-# e.g., the "happy" emoji maps to songs 4 and 1; the "sad" emoji maps to songs 2 and 5, etc.
-INITIAL_EMOJI_SONG_MAP = {
-    1: [4, 1],  # Happy maps to "Happy" and "Star Wars Theme"
-    2: [2, 5],  # Sad maps to "Nuvole Bianche" and "Ain't No Sunshine"
-    3: [3],     # Angry maps to "Rolling in the Deep"
-    4: [2, 4],  # Love maps to "Nuvole Bianche" and "Happy"
-}
-
-
-def get_db_connection():
-    """Return a connection to the SQLite database, creating tables if necessary."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    create_tables_if_needed(conn)
-    return conn
-
-
-def create_tables_if_needed(conn):
-    """Create the tables for users, emojis, songs and mappings if they don't exist."""
-    c = conn.cursor()
-
-    # Users table similar to signuppage1 in Java version
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            age INTEGER,
-            gender TEXT
-        )
-        """
-    )
-
-    # Emojis table similar to emoji1 in Java version
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS emojis (
-            emoji_id INTEGER PRIMARY KEY,
-            description TEXT NOT NULL,
-            emoji TEXT NOT NULL
-        )
-        """
-    )
-
-    # Songs table similar to songs table in Java version
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS songs (
-            id INTEGER PRIMARY KEY,
-            author TEXT,
-            movie_name TEXT,
-            music_producer TEXT,
-            name TEXT,
-            singer TEXT
-        )
-        """
-    )
-
-    # Mapping table between emoji and song (similar to emoji_song_mappings)
-    c.execute(
-        """
-        CREATE TABLE IF NOT EXISTS emoji_song_mappings (
-            emoji_id INTEGER,
-            song_id INTEGER,
-            FOREIGN KEY (emoji_id) REFERENCES emojis(emoji_id),
-            FOREIGN KEY (song_id) REFERENCES songs(id)
-        )
-        """
-    )
+SONG_FIELDS = ("id", "name", "singer", "author", "movie_name", "music_producer", "spotify_url")
 
-    conn.commit()
+SONGS_FOR_EMOJI = f"""
+    SELECT {", ".join(f"s.{field}" for field in SONG_FIELDS)}
+    FROM songs s
+    JOIN emoji_song_mappings m ON s.id = m.song_id
+    WHERE m.emoji_id = ?
+    LIMIT ?
+"""
 
-    # If the emojis table is empty, insert initial data
-    if c.execute("SELECT COUNT(*) FROM emojis").fetchone()[0] == 0:
-        c.executemany(
-            "INSERT INTO emojis (emoji_id, description, emoji) VALUES (?, ?, ?)",
-            INITIAL_EMOJIS,
-        )
-        conn.commit()
+SONGS_FOR_MOOD = f"""
+    SELECT {", ".join(f"s.{field}" for field in SONG_FIELDS)}
+    FROM song_moods m
+    JOIN songs s ON s.id = m.song_id
+    WHERE m.mood = ?
+    ORDER BY m.position
+    LIMIT ?
+"""
 
-    # If the songs table is empty, insert sample songs
-    if c.execute("SELECT COUNT(*) FROM songs").fetchone()[0] == 0:
-        c.executemany(
-            "INSERT INTO songs (id, author, movie_name, music_producer, name, singer)"
-            " VALUES (?, ?, ?, ?, ?, ?)",
-            INITIAL_SONGS,
-        )
-        conn.commit()
 
-    # If the mapping table is empty, insert the initial emoji‑song relations
-    if c.execute("SELECT COUNT(*) FROM emoji_song_mappings").fetchone()[0] == 0:
-        mapping_entries = [
-            (emoji_id, song_id)
-            for emoji_id, song_ids in INITIAL_EMOJI_SONG_MAP.items()
-            for song_id in song_ids
-        ]
-        c.executemany(
-            "INSERT INTO emoji_song_mappings (emoji_id, song_id) VALUES (?, ?)",
-            mapping_entries,
-        )
-        conn.commit()
+def get_db_connection(path=DB_PATH):
+    """Return a connection to the SQLite database, migrating its schema if needed."""
+    conn = catalog.connect(path)
+    # Users, emojis, songs and their mappings; a no-op once the schema is current
+    catalog.migrate(conn)
+    return conn
 
 
 # -- User management functions --------------------------------------------------
@@ -212,19 +130,15 @@ def display_emojis(conn):
         print(f"{row['emoji_id']:>2}  | {row['emoji']}    | {row['description']}")
 
 
-def get_songs_for_emoji(conn, emoji_id):
-    """Retrieve a list of songs mapped to a given emoji ID."""
-    c = conn.cursor()
-    songs = c.execute(
-        """
-        SELECT s.id, s.name, s.singer, s.author, s.movie_name, s.music_producer
-        FROM songs s
-        JOIN emoji_song_mappings m ON s.id = m.song_id
-        WHERE m.emoji_id = ?
-        """,
-        (emoji_id,),
-    ).fetchall()
-    return songs
+def get_songs_for_emoji(conn, emoji_id, limit=-1):
+    """Retrieve songs mapped to a given emoji ID (up to ``limit``; -1 means all)."""
+    # The query text never changes, so SQLite's statement cache prepares it once
+    return conn.execute(SONGS_FOR_EMOJI, (emoji_id, limit)).fetchall()
+
+
+def get_songs_for_mood(conn, mood, limit):
+    """Retrieve up to ``limit`` songs tagged with ``mood``."""
+    return conn.execute(SONGS_FOR_MOOD, (mood, limit)).fetchall()
 
 
 def show_song_recommendations(conn):
@@ -245,16 +159,81 @@ def show_song_recommendations(conn):
         print("----+----------------------+----------------------+----------------------")
         for song in songs:
             print(
-                f"{song['id']:>2}  | {song['name'][:20]:<20} | "
-                f"{song['singer'][:20]:<20} | "
-                f"{song['author'][:20]:<20}"
+                f"{song['id']:>2}  | {(song['name'] or '-')[:20]:<20} | "
+                f"{(song['singer'] or '-')[:20]:<20} | "
+                f"{(song['author'] or '-')[:20]:<20}"
             )
 
 
+# -- Non-interactive bulk mode --------------------------------------------------
+
+def parse_query(line):
+    """Return ``("emoji", id)`` or ``("mood", name)`` for one input line."""
+    if line.startswith("{"):
+        query = json.loads(line)
+        if "emoji_id" in query:
+            return "emoji", int(query["emoji_id"])
+        return "mood", str(query["mood"]).strip().lower()
+    if line.isdigit():
+        return "emoji", int(line)
+    return "mood", line.lower()
+
+
+def run_batch(conn, lines, out, limit=10):
+    """Answer one query per line with a JSON line; returns the number of queries.
+
+    Results of repeated queries are served from memory.
+    """
+    cache = {}
+    count = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        count += 1
+        try:
+            kind, value = parse_query(line)
+        except (ValueError, KeyError, TypeError) as e:
+            out.write(json.dumps({"query": line, "error": f"Invalid query: {e}"}) + "\n")
+            continue
+        songs = cache.get((kind, value))
+        if songs is None:
+            if kind == "emoji":
+                rows = get_songs_for_emoji(conn, value, limit)
+            else:
+                rows = get_songs_for_mood(conn, value, limit)
+            songs = cache[kind, value] = [dict(zip(SONG_FIELDS, tuple(row))) for row in rows]
+        key = "emoji_id" if kind == "emoji" else "mood"
+        out.write(json.dumps({"query": line, key: value, "songs": songs}, ensure_ascii=False) + "\n")
+    out.flush()
+    return count
+
+
 # -- Main application loop ------------------------------------------------------
 
 def main():
-    conn = get_db_connection()
+    parser = argparse.ArgumentParser(description="Emoji-based music recommender.")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                        help="answer emoji IDs / moods from FILE (or stdin) as JSON lines")
+    parser.add_argument("--output", help="write batch results here instead of stdout")
+    parser.add_argument("--limit", type=int, default=10, help="songs per batch query")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database to use")
+    args = parser.parse_args()
+
+    conn = get_db_connection(args.db)
+    if args.batch is not None:
+        source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            run_batch(conn, source, out, args.limit)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if out is not sys.stdout:
+                out.close()
+            conn.close()
+        return
+
     print("\nWelcome to the Emoji‑Based Music Recommender!")
     while True:
         print("\nMain Menu:")
@@ -0,0 +1,200 @@
+"""
+Pluggable face detection and emotion classification for the mood pipeline.
+
+Face detection is the slowest stage of mood detection, so it runs on a
+downscaled copy of the frame and only the face crops, mapped back to full
+resolution, are passed to the FER emotion classifier. Three backends are
+available:
+
+- ``haar``      OpenCV Haar cascade on a grayscale thumbnail (default, cheapest)
+- ``mediapipe`` MediaPipe short-range face detector
+- ``mtcnn``     facenet-pytorch MTCNN, the slower high-accuracy mode FER uses
+
+``EmotionPipeline.detect_emotions`` returns the same structure as
+``FER.detect_emotions``; ``detect_batch`` classifies the faces of several
+frames in a single model call.
+"""
+import time
+
+import cv2
+import numpy as np
+
+# Input size and crop padding used by FER's bundled emotion model
+EMOTION_INPUT_SIZE = (64, 64)
+FACE_OFFSETS = (10, 10)
+
+DEFAULT_BACKEND = "haar"
+DEFAULT_DETECTION_WIDTH = 320
+
+
+def downscale(frame, width):
+    """Return ``frame`` resized to at most ``width`` pixels wide and the scale used."""
+    h, w = frame.shape[:2]
+    if not width or w <= width:
+        return frame, 1.0
+    scale = width / float(w)
+    small = cv2.resize(frame, (width, max(1, int(round(h * scale)))),
+                       interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+# -- Face detector backends -----------------------------------------------------
+
+class HaarFaceDetector:
+    """OpenCV Haar cascade run on a downscaled grayscale copy of the frame."""
+
+    def __init__(self, detection_width=DEFAULT_DETECTION_WIDTH, scale_factor=1.1,
+                 min_neighbors=5, min_face_ratio=0.1):
+        cascade_file = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        self.cascade = cv2.CascadeClassifier(cascade_file)
+        self.detection_width = detection_width
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_face_ratio = min_face_ratio
+
+    def find_faces(self, frame):
+        small, scale = downscale(frame, self.detection_width)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        min_side = max(20, int(min(gray.shape[:2]) * self.min_face_ratio))
+        faces = self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            flags=cv2.CASCADE_SCALE_IMAGE,
+            minSize=(min_side, min_side),
+        )
+        return [[int(v / scale) for v in face] for face in faces]
+
+
+class MediaPipeFaceDetector:
+    """MediaPipe BlazeFace short-range detector run on a downscaled copy."""
+
+    def __init__(self, detection_width=DEFAULT_DETECTION_WIDTH, min_confidence=0.5):
+        import mediapipe as mp
+        self.detector = mp.solutions.face_detection.FaceDetection(
+            model_selection=0, min_detection_confidence=min_confidence
+        )
+        self.detection_width = detection_width
+
+    def find_faces(self, frame):
+        h, w = frame.shape[:2]
+        small, _ = downscale(frame, self.detection_width)
+        # MediaPipe expects an RGB image; boxes come back relative to its size
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        result = self.detector.process(rgb)
+        faces = []
+        for detection in result.detections or []:
+            box = detection.location_data.relative_bounding_box
+            x, y = max(0, int(box.xmin * w)), max(0, int(box.ymin * h))
+            faces.append([x, y, int(box.width * w), int(box.height * h)])
+        return faces
+
+
+class MTCNNFaceDetector:
+    """facenet-pytorch MTCNN, the high-accuracy mode previously used by FER."""
+
+    def __init__(self, detection_width=None):
+        from facenet_pytorch import MTCNN
+        self.mtcnn = MTCNN(keep_all=True)
+        self.detection_width = detection_width
+
+    def find_faces(self, frame):
+        small, scale = downscale(frame, self.detection_width)
+        boxes, _ = self.mtcnn.detect(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+        faces = []
+        if isinstance(boxes, np.ndarray):
+            for x1, y1, x2, y2 in boxes:
+                faces.append([int(x1 / scale), int(y1 / scale),
+                              int((x2 - x1) / scale), int((y2 - y1) / scale)])
+        return faces
+
+
+FACE_DETECTORS = {
+    "haar": HaarFaceDetector,
+    "mediapipe": MediaPipeFaceDetector,
+    "mtcnn": MTCNNFaceDetector,
+}
+
+
+def build_face_detector(backend=DEFAULT_BACKEND, detection_width=DEFAULT_DETECTION_WIDTH):
+    """Instantiate the face detector registered under ``backend``."""
+    try:
+        factory = FACE_DETECTORS[backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown face detector '{backend}'. Choose one of: {', '.join(FACE_DETECTORS)}"
+        )
+    return factory(detection_width=detection_width)
+
+
+# -- Emotion pipeline -----------------------------------------------------------
+
+def _crop_face(gray, box):
+    """Square up and pad a face box the way FER does, then crop it from ``gray``."""
+    x, y, w, h = box
+    if h > w:
+        x -= (h - w) // 2
+        w = h
+    elif w > h:
+        y -= (w - h) // 2
+        h = w
+    x_off, y_off = FACE_OFFSETS
+    x1, y1 = max(0, x - x_off), max(0, y - y_off)
+    x2, y2 = x + w + x_off, y + h + y_off
+    crop = gray[y1:y2, x1:x2]
+    if crop.size == 0:
+        return None
+    crop = cv2.resize(crop, EMOTION_INPUT_SIZE).astype(np.float32)
+    return (crop / 255.0 - 0.5) * 2.0
+
+
+class EmotionPipeline:
+    """Face detection backend followed by FER's emotion classifier."""
+
+    def __init__(self, backend=DEFAULT_BACKEND, detection_width=DEFAULT_DETECTION_WIDTH):
+        from fer import FER
+        self.backend = backend
+        self.face_detector = build_face_detector(backend, detection_width)
+        # mtcnn=False keeps FER from loading its own MTCNN; we only use its classifier
+        self.classifier = FER(mtcnn=False)
+        self.labels = [label for _, label in sorted(self.classifier._get_labels().items())]
+        # Seconds spent per stage during the last ``detect_batch`` call
+        self.timings = {}
+
+    def find_faces(self, frame):
+        """Full-resolution face boxes, largest first."""
+        faces = self.face_detector.find_faces(frame)
+        return sorted(faces, key=lambda box: box[2] * box[3], reverse=True)
+
+    def detect_emotions(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        """Detect faces in every frame and classify all crops in one model call."""
+        crops, owners, boxes = [], [], []
+        detect_times = []
+        for index, frame in enumerate(frames):
+            start = time.perf_counter()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            faces = self.find_faces(frame)
+            detect_times.append(time.perf_counter() - start)
+            for box in faces:
+                crop = _crop_face(gray, box)
+                if crop is None:
+                    continue
+                crops.append(crop)
+                owners.append(index)
+                boxes.append(box)
+
+        self.timings = {"face_detection": detect_times}
+        results = [[] for _ in frames]
+        if not crops:
+            return results
+
+        start = time.perf_counter()
+        predictions = np.asarray(self.classifier._classify_emotions(np.array(crops)))
+        self.timings["emotion_classification"] = [time.perf_counter() - start]
+        for index, box, scores in zip(owners, boxes, predictions):
+            emotions = {label: round(float(score), 2) for label, score in zip(self.labels, scores)}
+            results[index].append({"box": box, "emotions": emotions})
+        return results
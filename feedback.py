@@ -0,0 +1,142 @@
+"""
+Implicit-feedback logging for personalised recommendations.
+
+The web app records which recommended songs a user clicked or opened on
+Spotify. Events are buffered in memory and written by a background thread in
+batches (one ``executemany`` per flush) to the append-only ``interactions``
+table of the users database. The table has no secondary indexes so inserts
+stay cheap; it is only scanned offline by ``cf.py`` when training.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import db
+
+# Implicit-feedback strength of each event type
+EVENT_WEIGHTS = {
+    "click": 1.0,
+    "play": 3.0,
+}
+
+
+def create_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS interactions (
+            user_id INTEGER NOT NULL,
+            song_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            weight REAL NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+    conn.commit()
+
+
+def load_interactions(conn, since_rowid=0, user_ids=None):
+    """Return ``(rowids, user_ids, song_ids, weights)`` arrays of logged events."""
+    query = "SELECT rowid, user_id, song_id, weight FROM interactions WHERE rowid > ?"
+    params = [since_rowid]
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        query += f" AND user_id IN ({', '.join('?' * len(user_ids))})"
+        params += user_ids
+    rows = conn.execute(query, params).fetchall()
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, np.empty(0, dtype=np.float32)
+    data = np.array(rows, dtype=np.float64)
+    return (data[:, 0].astype(np.int64), data[:, 1].astype(np.int64),
+            data[:, 2].astype(np.int64), data[:, 3].astype(np.float32))
+
+
+class InteractionLog:
+    """Buffers interaction events and flushes them to SQLite in batches."""
+
+    def __init__(self, path, batch_size=500, flush_interval=2.0):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        conn = db.connect(self.path)
+        create_table(conn)
+        conn.close()
+
+        self._start()
+        atexit.register(self.close)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._restart)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="interaction-log", daemon=True)
+        self._thread.start()
+
+    def _restart(self):
+        # The writer thread does not survive a fork; buffered events stay with the parent
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        if not self._closed:
+            self._start()
+
+    def record(self, user_id, song_id, event):
+        """Queue one event; unknown event types raise ``ValueError``."""
+        if event not in EVENT_WEIGHTS:
+            raise ValueError(f"Unknown event '{event}'")
+        with self._lock:
+            self._buffer.append((int(user_id), int(song_id), event, EVENT_WEIGHTS[event], time.time()))
+            if len(self._buffer) >= self.batch_size:
+                self._wake.set()
+
+    def flush(self, conn=None):
+        """Write all buffered events in a single transaction."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        own = conn is None
+        if own:
+            conn = db.connect(self.path)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO interactions (user_id, song_id, event, weight, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    batch,
+                )
+        finally:
+            if own:
+                conn.close()
+        return len(batch)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        conn = db.connect(self.path)
+        try:
+            while not self._closed:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                try:
+                    self.flush(conn)
+                except sqlite3.Error:
+                    # Keep serving; events of a failed batch are dropped
+                    pass
+            self.flush(conn)
+        finally:
+            conn.close()
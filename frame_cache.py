@@ -0,0 +1,102 @@
+"""
+Perceptual-hash cache for emotion detection results.
+
+Users tend to press "Detect Mood" repeatedly while sitting still, which
+produces nearly identical frames. Each frame is reduced to a 64-bit
+difference hash (dHash) of a tiny grayscale thumbnail; frames whose hashes
+are within ``max_distance`` bits of a cached entry reuse its detection
+result instead of running inference again.
+
+The cache is a bounded LRU with a per-entry time-to-live and keeps hit/miss
+counters so the tolerance, TTL and size can be tuned.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def dhash(frame, hash_size=8):
+    """Return the difference hash of ``frame`` as an integer of ``hash_size**2`` bits."""
+    import cv2  # deferred so importing this module does not load OpenCV
+    # Shrink first so the colour conversion only touches a handful of pixels
+    small = cv2.resize(frame, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    diff = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(diff).tobytes(), "big")
+
+
+def hamming(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+class FrameCache:
+    """Bounded LRU cache keyed by perceptual hash with Hamming tolerance and TTL."""
+
+    def __init__(self, max_entries=512, ttl=30.0, max_distance=4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # hash -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, max_distance=None):
+        """Return the cached value for ``key`` or a near match, else ``None``.
+
+        ``max_distance`` overrides the tolerance for this lookup, e.g. to
+        accept looser matches when the server is overloaded.
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        now = time.monotonic()
+        with self._lock:
+            match = key if key in self._entries else None
+            if match is None and max_distance > 0:
+                best = max_distance + 1
+                for candidate in self._entries:
+                    distance = hamming(key, candidate)
+                    if distance < best:
+                        match, best = candidate, distance
+            if match is not None:
+                stored_at, value = self._entries[match]
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(match)
+                    self.hits += 1
+                    return value
+                del self._entries[match]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store ``value`` under ``key``, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for tuning the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "max_distance": self.max_distance,
+            }
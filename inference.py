@@ -0,0 +1,424 @@
+"""
+Process-based inference pool for facial emotion recognition.
+
+Every worker process loads its own emotion pipeline (see
+``face_detection.EmotionPipeline``), so detections run in parallel
+on separate cores instead of being serialised on one model instance inside
+the Flask request thread. Frames submitted from request threads are gathered
+by a dispatcher thread into small batches (bounded by ``max_batch_size`` and
+``max_wait_ms``) and handed to whichever worker is free over its own pipe;
+results come back through a collector thread that resolves the waiting
+futures. The collector also watches the worker processes: when one dies
+(out of memory, a native crash in the model), the frames it was working on
+fail with ``InferenceError`` and a replacement worker is started.
+
+Usage:
+
+    pool = InferencePool(workers=4, max_batch_size=8, max_wait_ms=10, backend="haar")
+    results = pool.detect_emotions(frame, timeout=5)
+
+``detect_emotions`` returns the same structure as ``FER.detect_emotions``.
+Frames may carry a deadline; frames still waiting to be batched when their
+deadline passes are dropped (their future raises ``TimeoutError``) instead
+of keeping workers busy for a caller that has given up.
+The pool starts lazily on first use (or on ``start()``) and restarts itself
+after a fork, so it is safe to create at import time. Workers report when
+their model has loaded; ``status()`` summarises this for readiness checks.
+"""
+import atexit
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+
+class InferenceError(RuntimeError):
+    """Raised when a worker fails to process a frame."""
+
+
+def _load_detector(backend, detection_width):
+    """Build the emotion pipeline inside a worker process."""
+    from face_detection import EmotionPipeline
+    return EmotionPipeline(backend=backend, detection_width=detection_width)
+
+
+def _run_batch(detector, batch):
+    """Classify a whole batch at once, falling back to frame-by-frame on error.
+
+    Returns ``(results, timings)``; ``timings`` maps stage names to lists of
+    durations in seconds as recorded by the pipeline.
+    """
+    try:
+        outputs = detector.detect_batch([frame for _, frame in batch])
+        results = [(task_id, output, None) for (task_id, _), output in zip(batch, outputs)]
+        return results, getattr(detector, "timings", {})
+    except Exception:
+        pass
+    results, timings = [], {}
+    for task_id, frame in batch:
+        try:
+            results.append((task_id, detector.detect_emotions(frame), None))
+            for stage, durations in getattr(detector, "timings", {}).items():
+                timings.setdefault(stage, []).extend(durations)
+        except Exception as e:
+            results.append((task_id, None, f"{type(e).__name__}: {e}"))
+    return results, timings
+
+
+def _worker_main(tasks, results, backend, detection_width):
+    """Worker loop: load a model once, then process batches until told to stop."""
+    try:
+        detector = _load_detector(backend, detection_width)
+    except Exception as e:
+        results.send(("failed", f"{type(e).__name__}: {e}"))
+        return
+    results.send(("ready", None))
+    while True:
+        try:
+            batch = tasks.recv()
+        except EOFError:
+            break
+        if batch is None:
+            break
+        results.send(("results",) + _run_batch(detector, batch))
+
+
+class _Worker:
+    """A worker process, its private pipes and the batch it is working on."""
+
+    def __init__(self, ctx, backend, detection_width):
+        child_tasks, self.tasks = ctx.Pipe(duplex=False)  # (receive end, send end)
+        self.results, child_results = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_tasks, child_results, backend, detection_width),
+            daemon=True,
+        )
+        self.process.start()
+        child_tasks.close()
+        child_results.close()
+        self.pid = self.process.pid
+        self.batch = None  # task ids sent and not answered yet
+        self.alive = True
+
+    def close(self):
+        self.tasks.close()
+        self.results.close()
+
+
+class InferencePool:
+    """A pool of emotion-detection worker processes fed by a micro-batching queue."""
+
+    def __init__(self, workers=None, max_batch_size=8, max_wait_ms=10,
+                 backend="haar", detection_width=320, on_timings=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.backend = backend
+        self.detection_width = detection_width
+        # Called from the collector thread with each batch's stage timings
+        self.on_timings = on_timings
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._ids = itertools.count()
+        self._futures = {}
+        self._futures_lock = threading.Lock()
+        self._pending = None
+        self._ctx = None
+        self._workers = []
+        self._workers_changed = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._ready = set()
+        self._failed = {}
+        self.restarts = 0
+        atexit.register(self.close)
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def _ensure_started(self):
+        """Start workers and helper threads once per process."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Anything inherited across a fork belongs to the parent.
+            self._ctx = multiprocessing.get_context("spawn")
+            self._futures = {}
+            self._ready = set()
+            self._failed = {}
+            self._pending = queue.Queue()
+            self._workers_changed = threading.Condition()
+            self._stopping = threading.Event()
+            self._workers = [self._spawn() for _ in range(self.workers)]
+            self._threads = [
+                threading.Thread(target=self._dispatch, name="inference-dispatch", daemon=True),
+                threading.Thread(target=self._collect, name="inference-collect", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.backend, self.detection_width)
+
+    def close(self):
+        """Stop the helper threads and worker processes."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._pid = None
+            self._stopping.set()
+            self._pending.put(None)
+            with self._workers_changed:
+                self._workers_changed.notify_all()
+            workers = list(self._workers)
+            for worker in workers:
+                try:
+                    worker.tasks.send(None)
+                except OSError:
+                    pass
+            for worker in workers:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            for thread in self._threads:
+                thread.join(timeout=1)
+            for worker in workers:
+                worker.close()
+            self._workers = []
+            self._threads = []
+            with self._futures_lock:
+                futures, self._futures = self._futures, {}
+            for future in futures.values():
+                future.set_exception(InferenceError("inference pool closed"))
+
+    # -- public API ---------------------------------------------------------
+
+    def start(self):
+        """Start the workers now (they load their models in the background)."""
+        self._ensure_started()
+
+    def submit(self, frame, deadline=None):
+        """Queue a BGR frame for detection and return a Future of its results.
+
+        ``deadline`` is a ``time.monotonic()`` value after which the frame is
+        dropped if no worker has picked it up yet.
+        """
+        self._ensure_started()
+        if len(self._failed) >= self.workers:
+            raise InferenceError(f"no inference worker could load the model: {self.error}")
+        future = Future()
+        task_id = next(self._ids)
+        with self._futures_lock:
+            self._futures[task_id] = future
+        self._pending.put((task_id, frame, deadline))
+        return future
+
+    def detect_emotions(self, frame, timeout=None):
+        """Blocking equivalent of ``FER.detect_emotions`` served by the pool."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return self.submit(frame, deadline).result(timeout)
+
+    @property
+    def queue_depth(self):
+        """Number of frames waiting to be batched."""
+        return self._pending.qsize() if self._pending is not None else 0
+
+    @property
+    def in_flight(self):
+        """Number of submitted frames that have not produced a result yet."""
+        return len(self._futures)
+
+    @property
+    def error(self):
+        """Model-loading error reported by a worker, if any."""
+        return next(iter(self._failed.values()), None)
+
+    def status(self):
+        """Lifecycle summary: ``idle``, ``loading``, ``ready`` or ``failed``."""
+        if self._pid != os.getpid():
+            state = "idle"
+        elif self._ready:
+            state = "ready"
+        elif len(self._failed) >= self.workers:
+            state = "failed"
+        else:
+            state = "loading"
+        return {
+            "state": state,
+            "backend": self.backend,
+            "workers": self.workers,
+            "ready_workers": len(self._ready),
+            "failed_workers": len(self._failed),
+            "restarts": self.restarts,
+            "error": self.error,
+        }
+
+    # -- helper threads -----------------------------------------------------
+
+    def _fail(self, task_ids, error):
+        for task_id in task_ids:
+            with self._futures_lock:
+                future = self._futures.pop(task_id, None)
+            if future is not None:
+                future.set_exception(error)
+
+    def _expire(self, batch):
+        """Fail frames whose deadline has passed; return the rest as ``(id, frame)``."""
+        now = time.monotonic()
+        live, expired = [], []
+        for task_id, frame, deadline in batch:
+            if deadline is None or deadline > now:
+                live.append((task_id, frame))
+            else:
+                expired.append(task_id)
+        self._fail(expired, TimeoutError("deadline passed before inference started"))
+        return live
+
+    def _idle_worker(self):
+        """Wait for a live worker without a batch and reserve it (``None`` when stopping)."""
+        with self._workers_changed:
+            while not self._stopping.is_set():
+                for worker in self._workers:
+                    if worker.alive and worker.batch is None:
+                        worker.batch = []
+                        return worker
+                self._workers_changed.wait()
+        return None
+
+    def _dispatch(self):
+        """Group pending frames into batches and hand each to an idle worker.
+
+        Each worker gets one batch at a time, so the dispatcher always knows
+        which frames a worker holds and frames keep waiting here (where
+        their deadlines are checked) rather than in a worker's pipe.
+        """
+        while True:
+            worker = self._idle_worker()
+            if worker is None:
+                return
+            item = self._pending.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._pending.put(None)
+                    break
+                batch.append(item)
+            batch = self._expire(batch)
+            if not batch:
+                self._assign(worker, None)
+                continue
+            # The reserved worker may have died meanwhile; use another one
+            while not self._assign(worker, [task_id for task_id, _ in batch]):
+                worker = self._idle_worker()
+                if worker is None:
+                    return  # closing; close() fails the remaining futures
+            try:
+                worker.tasks.send(batch)
+            except OSError:
+                pass  # the worker died; the collector fails its batch
+
+    def _assign(self, worker, task_ids):
+        """Record ``task_ids`` as ``worker``'s batch; ``False`` if it has died."""
+        with self._workers_changed:
+            if not worker.alive:
+                return False
+            worker.batch = task_ids
+            self._workers_changed.notify_all()
+            return True
+
+    def _collect(self):
+        """Resolve futures as workers report results and replace dead workers."""
+        while not self._stopping.is_set():
+            workers = list(self._workers)
+            handles = [worker.results for worker in workers]
+            handles += [worker.process.sentinel for worker in workers]
+            ready = wait(handles, timeout=0.5)
+            for worker in workers:
+                if worker.results in ready:
+                    try:
+                        while worker.results.poll():
+                            self._handle(worker, worker.results.recv())
+                    except (EOFError, OSError):
+                        pass
+                if worker.process.sentinel in ready:
+                    self._worker_exited(worker)
+
+    def _handle(self, worker, message):
+        if message[0] != "results":
+            self._worker_status(message[0], worker.pid, message[1])
+            return
+        _, results, timings = message
+        with self._workers_changed:
+            worker.batch = None
+            self._workers_changed.notify_all()
+        if self.on_timings is not None and timings:
+            try:
+                self.on_timings(timings)
+            except Exception:
+                pass
+        for task_id, value, error in results:
+            with self._futures_lock:
+                future = self._futures.pop(task_id, None)
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(InferenceError(error))
+            else:
+                future.set_result(value)
+
+    def _worker_exited(self, worker):
+        """Fail the batch of a worker that died and start a replacement.
+
+        Only workers that had loaded their model are replaced. One that dies
+        before reporting ``ready`` (a native crash or OOM while loading) is
+        recorded as failed, like a worker whose model raised, so a pool that
+        cannot load at all fails fast instead of respawning forever.
+        """
+        worker.process.join()
+        exitcode = worker.process.exitcode
+        with self._workers_changed:
+            worker.alive = False
+            task_ids, worker.batch = worker.batch or [], None
+            self._workers.remove(worker)
+            respawn = worker.pid in self._ready and not self._stopping.is_set()
+            self._ready.discard(worker.pid)
+            if respawn:
+                self._workers.append(self._spawn())
+                self.restarts += 1
+            self._workers_changed.notify_all()
+        worker.close()
+        self._fail(task_ids, InferenceError(
+            f"inference worker {worker.pid} exited with code {exitcode}"))
+        if not respawn and worker.pid not in self._failed and not self._stopping.is_set():
+            self._worker_status(
+                "failed", worker.pid, f"worker exited with code {exitcode} while loading")
+
+    def _worker_status(self, kind, pid, error):
+        if kind == "ready":
+            self._ready.add(pid)
+            return
+        self._failed[pid] = error
+        if len(self._failed) >= self.workers:
+            # Nobody will ever answer the queued frames
+            with self._futures_lock:
+                futures, self._futures = self._futures, {}
+            for future in futures.values():
+                future.set_exception(InferenceError(f"model failed to load: {error}"))
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Streaming bulk import of song catalogs from CSV or JSON-lines exports.
+
+Records are read lazily with generators and appended to an unindexed staging
+table in large ``executemany`` transactions, so memory use does not depend
+on the size of the input. Each transaction also stores how many records have
+been loaded, so an interrupted import resumes where it stopped. Once the
+whole file is staged, it is merged into the catalog with a few set-based
+statements: songs are upserted (by ``id`` when the export has one,
+otherwise by name and singer), and mood tags, emoji mappings and emotion
+profiles are added without creating duplicates. The catalog's secondary
+indexes are dropped for the bulk inserts and rebuilt once afterwards.
+Malformed records are reported with their line number and skipped.
+
+Recognised fields (all optional except ``name`` and ``singer``):
+
+  id, name, singer, author, movie_name, music_producer, spotify_url,
+  youtube_url, moods, emojis, angry, disgust, fear, happy, sad, surprise, neutral
+
+The web app plays every ranked song through Spotify, so records without a
+``spotify_url`` are imported without their mood tags and emotion profile.
+
+``moods`` and ``emojis`` hold several values separated by ``;`` or ``|`` in
+CSV files, or JSON lists in JSON-lines files.
+
+Usage:
+
+  $ python3 ingest.py tracks.csv
+  $ python3 ingest.py tracks.jsonl --batch-size 100000
+  $ python3 ingest.py tracks.csv --restart     # ignore a previous checkpoint
+"""
+import argparse
+import csv
+import itertools
+import json
+import re
+import time
+from pathlib import Path
+
+import catalog
+from catalog import EMOTIONS
+
+SONG_FIELDS = ("id", "name", "singer", "author", "movie_name", "music_producer",
+               "spotify_url", "youtube_url")
+STAGING_COLUMNS = ("seq",) + SONG_FIELDS + EMOTIONS + ("has_emotions",)
+SPOTIFY_URL = SONG_FIELDS.index("spotify_url")
+SEPARATORS = re.compile(r"[;|]")
+
+
+def create_staging_tables(conn):
+    """Staging tables have no secondary indexes so appends stay cheap."""
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS ingest_staging (
+            seq INTEGER PRIMARY KEY,
+            id INTEGER,
+            name TEXT,
+            singer TEXT,
+            author TEXT,
+            movie_name TEXT,
+            music_producer TEXT,
+            spotify_url TEXT,
+            youtube_url TEXT,
+            {", ".join(f"{emotion} REAL" for emotion in EMOTIONS)},
+            has_emotions INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS ingest_staging_moods (seq INTEGER, mood TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS ingest_staging_emojis (seq INTEGER, emoji_id INTEGER)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+            source TEXT PRIMARY KEY,
+            records INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    conn.commit()
+
+
+def clear_staging(conn):
+    for table in ("ingest_staging", "ingest_staging_moods", "ingest_staging_emojis"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("DROP INDEX IF EXISTS idx_ingest_staging_name_singer")
+
+
+# -- Readers --------------------------------------------------------------------
+
+# Readers yield ``(line number, record)``. JSON lines are yielded undecoded
+# and parsed per record in ``stage``, so a malformed line is reported and
+# skipped instead of aborting the import.
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                yield number, line
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+PARSERS = {"jsonl": json.loads}
+
+
+def _values(value):
+    if value is None or value == "":
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in SEPARATORS.split(str(value)) if v.strip()]
+
+
+def _blank_to_none(value):
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value == "" else value
+
+
+def normalise(record):
+    """Split one input record into staging, mood and emoji values."""
+    song = tuple(_blank_to_none(record.get(field)) for field in SONG_FIELDS)
+    emotions = tuple(_blank_to_none(record.get(emotion)) for emotion in EMOTIONS)
+    has_emotions = int(any(value is not None for value in emotions))
+    emotions = tuple(float(value) if value is not None else 0.0 for value in emotions)
+    moods = [mood.lower() for mood in _values(record.get("moods"))]
+    emojis = [int(emoji) for emoji in _values(record.get("emojis"))]
+    return song + emotions + (has_emotions,), moods, emojis
+
+
+def batches(records, size):
+    """Yield lists of at most ``size`` items from ``records``."""
+    iterator = iter(records)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+# -- Import steps ---------------------------------------------------------------
+
+def stage(conn, source, records, start, batch_size, progress=print, parse=None):
+    """Append ``records`` (numbered from ``start``) to the staging tables.
+
+    ``records`` yields ``(line number, record)``; ``parse`` decodes raw
+    records. Rejected records keep their number, so resumed imports skip
+    the same count of records. Returns ``(loaded, rejected)``.
+    """
+    loaded = start
+    rejected = 0
+    for batch in batches(records, batch_size):
+        songs, moods, emojis = [], [], []
+        for offset, (line, record) in enumerate(batch):
+            seq = loaded + offset
+            try:
+                if parse is not None:
+                    record = parse(record)
+                song, song_moods, song_emojis = normalise(record)
+            except (ValueError, TypeError, AttributeError) as e:
+                progress(f"  skipping line {line}: {e}")
+                rejected += 1
+                continue
+            if song[1] is None or song[2] is None:
+                progress(f"  skipping line {line}: every song needs a name and a singer")
+                rejected += 1
+                continue
+            if song[SPOTIFY_URL] is None:
+                # Unplayable in the web app: keep it out of ranking
+                song, song_moods = song[:-1] + (0,), []
+            songs.append((seq,) + song)
+            moods.extend((seq, mood) for mood in song_moods)
+            emojis.extend((seq, emoji) for emoji in song_emojis)
+        loaded += len(batch)
+        with conn:
+            conn.executemany(
+                f"INSERT INTO ingest_staging ({', '.join(STAGING_COLUMNS)})"
+                f" VALUES ({', '.join('?' * len(STAGING_COLUMNS))})",
+                songs,
+            )
+            conn.executemany("INSERT INTO ingest_staging_moods VALUES (?, ?)", moods)
+            conn.executemany("INSERT INTO ingest_staging_emojis VALUES (?, ?)", emojis)
+            conn.execute(
+                "UPDATE ingest_checkpoints SET records = ?, updated_at = ? WHERE source = ?",
+                (loaded, time.time(), source),
+            )
+        progress(f"  staged {loaded} records ({rejected} rejected)")
+    return loaded, rejected
+
+
+def merge(conn):
+    """Upsert the staged records into the catalog tables in one transaction."""
+    base = conn.execute(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM songs), 0),"
+        " COALESCE((SELECT MAX(id) FROM ingest_staging), 0))"
+    ).fetchone()[0]
+    with conn:
+        # Resolve ids: explicit ids win, then existing songs with the same name
+        # and singer, then one new id per distinct name/singer in the file.
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ingest_staging_name_singer"
+            " ON ingest_staging (name, singer)"
+        )
+        conn.execute(
+            """
+            UPDATE ingest_staging SET id = (
+                SELECT s.id FROM songs s
+                WHERE s.name = ingest_staging.name AND s.singer IS ingest_staging.singer
+                LIMIT 1
+            ) WHERE id IS NULL
+            """
+        )
+        conn.execute(
+            """
+            UPDATE ingest_staging SET id = ? + (
+                SELECT MIN(t.seq) FROM ingest_staging t
+                WHERE t.name = ingest_staging.name AND t.singer IS ingest_staging.singer
+            ) + 1 WHERE id IS NULL
+            """,
+            (base,),
+        )
+
+        # Work out which mood tags and emoji mappings are new while the
+        # catalog's lookup indexes still exist, then load without them and
+        # rebuild them once at the end.
+        conn.execute("DROP TABLE IF EXISTS temp.ingest_new_moods")
+        conn.execute(
+            """
+            CREATE TEMP TABLE ingest_new_moods AS
+            SELECT DISTINCT m.mood AS mood, st.id AS song_id
+            FROM ingest_staging_moods m JOIN ingest_staging st ON st.seq = m.seq
+            WHERE NOT EXISTS (
+                SELECT 1 FROM song_moods x WHERE x.song_id = st.id AND x.mood = m.mood
+            )
+            """
+        )
+        conn.execute("DROP TABLE IF EXISTS temp.ingest_new_emojis")
+        conn.execute(
+            """
+            CREATE TEMP TABLE ingest_new_emojis AS
+            SELECT DISTINCT e.emoji_id AS emoji_id, st.id AS song_id
+            FROM ingest_staging_emojis e JOIN ingest_staging st ON st.seq = e.seq
+            WHERE NOT EXISTS (
+                SELECT 1 FROM emoji_song_mappings x
+                WHERE x.emoji_id = e.emoji_id AND x.song_id = st.id
+            )
+            """
+        )
+        catalog.drop_indexes(conn)
+
+        columns = ", ".join(SONG_FIELDS)
+        updates = ", ".join(
+            f"{field} = COALESCE(excluded.{field}, songs.{field})" for field in SONG_FIELDS[1:]
+        )
+        conn.execute(
+            f"""
+            INSERT INTO songs ({columns})
+            SELECT {columns} FROM ingest_staging WHERE true ORDER BY seq
+            ON CONFLICT(id) DO UPDATE SET {updates}
+            """
+        )
+
+        conn.execute(
+            f"""
+            INSERT OR REPLACE INTO song_emotions (song_id, {", ".join(EMOTIONS)})
+            SELECT id, {", ".join(EMOTIONS)} FROM ingest_staging WHERE has_emotions
+            """
+        )
+
+        # New mood tags continue each mood's dense position sequence
+        conn.execute(
+            """
+            INSERT INTO song_moods (mood, position, song_id)
+            SELECT n.mood,
+                   COALESCE(b.next_position, 0)
+                       + ROW_NUMBER() OVER (PARTITION BY n.mood ORDER BY n.song_id) - 1,
+                   n.song_id
+            FROM ingest_new_moods n
+            LEFT JOIN (
+                SELECT mood, MAX(position) + 1 AS next_position FROM song_moods GROUP BY mood
+            ) b ON b.mood = n.mood
+            """
+        )
+
+        conn.execute(
+            "INSERT INTO emoji_song_mappings (emoji_id, song_id)"
+            " SELECT emoji_id, song_id FROM ingest_new_emojis"
+        )
+
+        catalog.create_indexes(conn)
+        conn.execute("DROP TABLE temp.ingest_new_moods")
+        conn.execute("DROP TABLE temp.ingest_new_emojis")
+        clear_staging(conn)
+    conn.execute("ANALYZE")
+
+
+def import_file(path, db_path=catalog.CATALOG_PATH, fmt=None, batch_size=50000,
+                restart=False, progress=print):
+    """Import ``path`` into the catalog at ``db_path``; returns the number of records."""
+    path = Path(path)
+    fmt = fmt or ("jsonl" if path.suffix in (".jsonl", ".ndjson") else "csv")
+    source = str(path.resolve())
+
+    conn = catalog.connect(db_path)
+    catalog.migrate(conn)
+    create_staging_tables(conn)
+
+    row = conn.execute(
+        "SELECT records, status FROM ingest_checkpoints WHERE source = ?", (source,)
+    ).fetchone()
+    if row and row["status"] == "merged" and not restart:
+        progress(f"{path} was already imported; use --restart to import it again.")
+        conn.close()
+        return row["records"]
+
+    start = 0
+    if row and row["status"] == "loading" and not restart:
+        start = row["records"]
+        progress(f"Resuming {path} after {start} records")
+    else:
+        # Only one import can own the staging tables at a time
+        with conn:
+            clear_staging(conn)
+            conn.execute("DELETE FROM ingest_checkpoints WHERE status = 'loading'")
+            conn.execute(
+                "INSERT OR REPLACE INTO ingest_checkpoints VALUES (?, 0, 'loading', ?)",
+                (source, time.time()),
+            )
+
+    records = itertools.islice(READERS[fmt](path), start, None)
+    loaded, rejected = stage(conn, source, records, start, batch_size, progress, PARSERS.get(fmt))
+
+    progress("Merging into catalog...")
+    merge(conn)
+    with conn:
+        conn.execute(
+            "UPDATE ingest_checkpoints SET status = 'merged', updated_at = ? WHERE source = ?",
+            (time.time(), source),
+        )
+    conn.close()
+    progress(f"Imported {loaded} records from {path} ({rejected} rejected in this run)")
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import songs into the catalog.")
+    parser.add_argument("path", help="CSV or JSON-lines file")
+    parser.add_argument("--format", choices=sorted(READERS), help="input format (default: by extension)")
+    parser.add_argument("--db", default=str(catalog.CATALOG_PATH), help="catalog database")
+    parser.add_argument("--batch-size", type=int, default=50000, help="records per transaction")
+    parser.add_argument("--restart", action="store_true", help="ignore any previous checkpoint")
+    args = parser.parse_args()
+    import_file(args.path, args.db, args.format, args.batch_size, args.restart)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are plain Python objects guarded by a lock;
+recording a value is a dict lookup plus an addition (a bisect for
+histograms), so instrumentation can stay on under full load. Metrics with
+labels hand out one child per label combination; resolve hot-path children
+once with ``labels(...)`` and keep them in module globals.
+
+Usage:
+
+    REQUESTS = REGISTRY.counter("requests_total", "Requests served.", ["endpoint"])
+    DECODE = REGISTRY.histogram("stage_seconds", "Stage latency.", ["stage"]).labels(stage="decode")
+
+    REQUESTS.labels(endpoint="detect_mood").inc()
+    with DECODE.time():
+        ...
+    text = REGISTRY.render()
+
+Values are per process: with several server processes, each one exposes its
+own numbers and the scraper aggregates them.
+"""
+import bisect
+import math
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond decodes to slow inference
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Timer:
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metric.observe(time.perf_counter() - self.start)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [("", None, self.value)]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self.value = float(value)
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from ``function()`` at scrape time."""
+        self._function = function
+
+    def samples(self):
+        value = self._function() if self._function is not None else self.value
+        return [("", None, value)]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the duration of its block in seconds."""
+        return _Timer(self)
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            samples.append(("_bucket", f'le="{_format_value(bound)}"', cumulative))
+        samples.append(("_sum", None, total))
+        samples.append(("_count", None, cumulative))
+        return samples
+
+
+class Metric:
+    """A named metric family; ``labels()`` returns the child for one label set."""
+
+    def __init__(self, kind, name, documentation, labelnames, make_child):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._make_child = make_child
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._children[()] = make_child()
+
+    def labels(self, **labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._make_child())
+        return child
+
+    def __getattr__(self, attr):
+        # Unlabelled metrics forward inc/set/observe/time to their only child
+        if attr.startswith("_") or "_default" not in self.__dict__:
+            raise AttributeError(attr)
+        return getattr(self._default, attr)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            for suffix, extra, value in child.samples():
+                labels = _format_labels(self.labelnames, key, extra)
+                lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    """Creates metrics and renders them in the Prometheus text format."""
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, kind, name, documentation, labelnames, make_child):
+        name = self.prefix + name
+        with self._lock:
+            if name in self._metrics:
+                raise ValueError(f"Metric '{name}' is already registered")
+            metric = self._metrics[name] = Metric(kind, name, documentation, labelnames, make_child)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register("counter", name, documentation, labelnames, _CounterChild)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register("gauge", name, documentation, labelnames, _GaugeChild)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        buckets = tuple(sorted(float(b) for b in buckets if b != math.inf))
+        return self._register("histogram", name, documentation, labelnames,
+                              lambda: _HistogramChild(buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(prefix="melobot_")
@@ -0,0 +1,264 @@
+"""
+Vectorised emotion-based ranking of the song catalog.
+
+Every track has an emotion profile: a vector over the seven FER emotions,
+taken from ``song_emotions`` when present or derived from its mood tags via
+``MOOD_PROFILES``. Profiles are stored as one contiguous, L2-normalised
+float32 matrix laid out emotion-major (7 x tracks), so scoring the whole
+catalog against a detected emotion distribution is a single vector-matrix
+product over long contiguous rows, and ``np.argpartition`` picks the top
+candidates without sorting the full catalog.
+
+Usage:
+
+    engine = RankingEngine.from_catalog(catalog)
+    song_ids = engine.rank({"happy": 0.7, "surprise": 0.2, "neutral": 0.1}, k=4)
+"""
+import itertools
+import os
+import threading
+import time
+import weakref
+
+import numpy as np
+
+from catalog import EMOTIONS
+
+# Engines without an explicit seed; forked children (workers of a preloaded
+# server) reseed them so they do not all draw the same jitter sequence
+_unseeded = weakref.WeakSet()
+
+
+def _reseed_after_fork():
+    for engine in list(_unseeded):
+        engine._rng = np.random.default_rng()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reseed_after_fork)
+
+EMOTION_INDEX = {emotion: i for i, emotion in enumerate(EMOTIONS)}
+
+# Emotion profile implied by each catalog mood tag. Moods FER can detect but
+# the catalog has no songs for (fear, disgust) borrow from related moods.
+MOOD_PROFILES = {
+    "happy":    {"happy": 1.0, "surprise": 0.2},
+    "sad":      {"sad": 1.0, "fear": 0.3},
+    "angry":    {"angry": 1.0, "disgust": 0.5},
+    "neutral":  {"neutral": 1.0},
+    "surprise": {"surprise": 1.0, "happy": 0.3, "fear": 0.2},
+    "fear":     {"fear": 1.0, "sad": 0.3},
+    "disgust":  {"disgust": 1.0, "angry": 0.5},
+}
+
+
+def emotion_vector(distribution):
+    """Dense float32 vector over ``EMOTIONS`` for a ``{emotion: score}`` dict."""
+    vector = np.zeros(len(EMOTIONS), dtype=np.float32)
+    for emotion, score in distribution.items():
+        index = EMOTION_INDEX.get(emotion)
+        if index is not None:
+            vector[index] = score
+    return vector
+
+
+class RankingEngine:
+    """Scores a pre-normalised emotion-profile matrix against detected emotions."""
+
+    def __init__(self, song_ids, profiles, seed=None):
+        profiles = np.ascontiguousarray(profiles, dtype=np.float32).reshape(-1, len(EMOTIONS))
+        norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.song_ids = np.ascontiguousarray(song_ids, dtype=np.int64)
+        # Emotion-major layout: scoring streams through 7 contiguous rows
+        self.matrix = np.ascontiguousarray((profiles / norms).T)
+        self._seed(seed)
+
+    def __len__(self):
+        return len(self.song_ids)
+
+    @classmethod
+    def from_matrix(cls, song_ids, matrix, seed=None):
+        """Wrap an already normalised emotion-major matrix without copying it.
+
+        Used for memory-mapped catalog snapshots (see ``snapshot.py``), whose
+        arrays are shared read-only between processes.
+        """
+        engine = cls.__new__(cls)
+        engine.song_ids = song_ids
+        engine.matrix = matrix
+        engine._seed(seed)
+        return engine
+
+    def _seed(self, seed):
+        self._rng = np.random.default_rng(seed)
+        if seed is None:
+            _unseeded.add(self)
+
+    @classmethod
+    def from_catalog(cls, catalog, seed=None):
+        """Build profiles for every tagged or profiled song in ``catalog``."""
+        if hasattr(catalog, "profile_matrix"):
+            song_ids, matrix = catalog.profile_matrix()
+            return cls.from_matrix(song_ids, matrix, seed=seed)
+        profiles = {}
+        for song_id, mood in catalog.mood_tags():
+            vector = profiles.get(song_id)
+            if vector is None:
+                vector = profiles[song_id] = np.zeros(len(EMOTIONS), dtype=np.float32)
+            vector += emotion_vector(MOOD_PROFILES.get(mood, {mood: 1.0}))
+        for song_id, profile in catalog.emotion_profiles():
+            profiles[song_id] = np.asarray(profile, dtype=np.float32)
+
+        song_ids = np.fromiter(profiles.keys(), dtype=np.int64, count=len(profiles))
+        matrix = np.empty((len(profiles), len(EMOTIONS)), dtype=np.float32)
+        for row, vector in enumerate(profiles.values()):
+            matrix[row] = vector
+        return cls(song_ids, matrix, seed=seed)
+
+    def scores(self, distribution):
+        """Cosine similarity of every track to ``distribution``."""
+        query = emotion_vector(distribution)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            query = emotion_vector({"neutral": 1.0})
+            norm = 1.0
+        return (query / norm) @ self.matrix
+
+    def rank(self, distribution, k=4, jitter=0.05, diversity=0.0, pool=None, exclude=None,
+             boost=None):
+        """Return the ids of the ``k`` best tracks for ``distribution``.
+
+        The top ``pool`` candidates (default ``8 * k``) are taken with
+        ``argpartition``. ``boost``, if given, is called with their song ids
+        and returns extra per-candidate scores (e.g. personalisation);
+        ``jitter`` then adds uniform noise so equally good tracks rotate
+        between requests. With ``diversity`` > 0 the candidates are re-ranked
+        with maximal marginal relevance so the picks do not all share the same
+        profile.
+        """
+        if len(self.song_ids) == 0 or k <= 0:
+            return []
+        return self._select(self.scores(distribution), k, jitter, diversity, pool, exclude, boost)
+
+    def rank_many(self, distributions, k=4, jitter=0.05, diversity=0.0, pool=None,
+                  exclude=None, boost=None):
+        """``rank`` for several distributions, scored with one matrix product."""
+        if len(self.song_ids) == 0 or k <= 0 or not distributions:
+            return [[] for _ in distributions]
+        queries = np.array([emotion_vector(d) for d in distributions])
+        norms = np.linalg.norm(queries, axis=1)
+        queries[norms == 0] = emotion_vector({"neutral": 1.0})
+        norms[norms == 0] = 1.0
+        scores = (queries / norms[:, None]) @ self.matrix
+        return [self._select(row, k, jitter, diversity, pool, exclude, boost) for row in scores]
+
+    def _select(self, scores, k, jitter, diversity, pool, exclude, boost):
+        n = len(self.song_ids)
+        if exclude is not None and len(exclude):
+            scores[np.isin(self.song_ids, exclude)] = -np.inf
+
+        pool = min(n, max(k, pool or k * 8))
+        candidates = np.argpartition(scores, n - pool)[n - pool:] if pool < n else np.arange(n)
+        relevance = scores[candidates]
+        if boost is not None:
+            relevance = relevance + boost(self.song_ids[candidates])
+        if jitter:
+            relevance = relevance + self._rng.random(len(candidates), dtype=np.float32) * jitter
+        order = np.argsort(-relevance)
+        candidates, relevance = candidates[order], relevance[order]
+        finite = np.isfinite(relevance)
+        candidates, relevance = candidates[finite], relevance[finite]
+
+        if diversity and len(candidates) > k:
+            picked = self._mmr(candidates, relevance, k, diversity)
+        else:
+            picked = candidates[:k]
+        return self.song_ids[picked].tolist()
+
+    def _mmr(self, candidates, relevance, k, diversity):
+        """Greedy maximal-marginal-relevance selection among ``candidates``."""
+        vectors = self.matrix[:, candidates].T
+        similarity = vectors @ vectors.T
+        chosen = [0]
+        max_sim = similarity[0].copy()
+        available = np.ones(len(candidates), dtype=bool)
+        available[0] = False
+        while len(chosen) < k:
+            mmr = (1 - diversity) * relevance - diversity * max_sim
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            chosen.append(best)
+            available[best] = False
+            np.maximum(max_sim, similarity[best], out=max_sim)
+        return candidates[chosen]
+
+
+class Recommender:
+    """Serves recommendations from a ``RankingEngine`` kept in sync with the catalog.
+
+    The engine is rebuilt in the background when the catalog changes (at most
+    once per ``refresh_interval`` seconds); requests keep using the previous
+    engine until the new one is swapped in.
+
+    Pass a trained ``cf.ImplicitALS`` as ``personalizer`` to blend each
+    user's collaborative-filtering preference (weighted by
+    ``personal_weight``) into the mood score of the candidate pool.
+    """
+
+    def __init__(self, catalog, refresh_interval=30.0, diversity=0.0,
+                 personalizer=None, personal_weight=0.3):
+        self.catalog = catalog
+        self.refresh_interval = refresh_interval
+        self.diversity = diversity
+        self.personalizer = personalizer
+        self.personal_weight = personal_weight
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._built_at = time.monotonic()
+        self._version = catalog.version
+        self.engine = RankingEngine.from_catalog(catalog)
+
+    def _maybe_refresh(self):
+        if self.catalog.version == self._version or self._rebuilding:
+            return
+        if time.monotonic() - self._built_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name="ranking-rebuild", daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            version = self.catalog.version
+            self.engine = RankingEngine.from_catalog(self.catalog)
+            self._version = version
+            self._built_at = time.monotonic()
+        finally:
+            self._rebuilding = False
+
+    def _options(self, user_id, options):
+        options.setdefault("diversity", self.diversity)
+        personalizer = self.personalizer
+        if personalizer is not None and user_id is not None:
+            options.setdefault(
+                "boost", lambda song_ids: self.personal_weight * personalizer.score(user_id, song_ids)
+            )
+        return options
+
+    def recommend(self, distribution, k=4, user_id=None, **options):
+        """Top ``k`` songs (as dicts) for an emotion distribution."""
+        song_ids = self.engine.rank(distribution, k=k, **self._options(user_id, options))
+        songs = self.catalog.get_songs(song_ids)
+        self._maybe_refresh()
+        return songs
+
+    def recommend_many(self, distributions, k=4, user_id=None, **options):
+        """``recommend`` for several distributions with one catalog lookup."""
+        rankings = self.engine.rank_many(distributions, k=k, **self._options(user_id, options))
+        songs = {song["id"]: song for song in
+                 self.catalog.get_songs(list(dict.fromkeys(itertools.chain.from_iterable(rankings))))}
+        self._maybe_refresh()
+        return [[songs[song_id] for song_id in ids if song_id in songs] for ids in rankings]
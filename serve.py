@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Production entry point for the web app.
+
+Runs ``server.app`` under gunicorn with the app preloaded: the catalog,
+ranking engine and collaborative-filtering factors are built once in the
+master process and shared copy-on-write with the forked web workers. Each
+web worker serves requests from a pool of threads, so auth pages, static
+files and emoji routes never wait behind a detection call; detection itself
+runs in the worker's ``InferencePool`` processes, sized so that all web
+workers together use about one inference process per CPU core. Workers
+start their inference pool (and model load) right after forking instead of
+on the first request.
+
+On SIGTERM/SIGINT gunicorn stops accepting connections, lets in-flight
+requests finish (up to ``--graceful-timeout``) and each worker then stops
+its inference processes and flushes buffered listening feedback.
+
+On platforms without gunicorn (Windows) this falls back to the threaded
+Werkzeug server with debug mode off.
+
+Usage:
+
+  $ python3 serve.py
+  $ python3 serve.py --bind 0.0.0.0:8000 --workers 4 --threads 16
+  $ WEB_WORKERS=2 INFERENCE_WORKERS=4 python3 serve.py
+"""
+import argparse
+import os
+
+BIND = os.environ.get("BIND", "0.0.0.0:8000")
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", min(os.cpu_count() or 1, 8)))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", 16))
+REQUEST_TIMEOUT = int(os.environ.get("REQUEST_TIMEOUT", 60))
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+
+
+def inference_workers_per_process(web_workers):
+    """Inference processes per web worker so the total roughly matches the cores."""
+    return max(1, (os.cpu_count() or 1) // max(1, web_workers))
+
+
+def post_worker_init(worker):
+    import server
+    if server.detector is not None:
+        server.detector.start()
+
+
+def worker_exit(server_, worker):
+    import server
+    if server.detector is not None:
+        server.detector.close()
+    server.interactions.close()
+
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": args.bind,
+                "workers": args.workers,
+                "threads": args.threads,
+                "worker_class": "gthread",
+                "preload_app": True,
+                "timeout": args.timeout,
+                "graceful_timeout": args.graceful_timeout,
+                "post_worker_init": post_worker_init,
+                "worker_exit": worker_exit,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import server
+            if server.detector is not None:
+                import cv2  # noqa: F401  (imported once here, shared with the workers)
+            return server.app
+
+    Application().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the web app with multiple workers.")
+    parser.add_argument("--bind", default=BIND)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS, help="web worker processes")
+    parser.add_argument("--threads", type=int, default=WEB_THREADS, help="request threads per worker")
+    parser.add_argument("--timeout", type=int, default=REQUEST_TIMEOUT)
+    parser.add_argument("--graceful-timeout", type=int, default=GRACEFUL_TIMEOUT)
+    args = parser.parse_args()
+
+    # Must be set before ``server`` is imported (and the pool is configured)
+    os.environ.setdefault("INFERENCE_WORKERS", str(inference_workers_per_process(args.workers)))
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("gunicorn is not available; falling back to the threaded development server")
+        import server
+        server.start_vision_warmup()
+        host, _, port = args.bind.rpartition(":")
+        server.app.run(host=host or "0.0.0.0", port=int(port), threaded=True, debug=False)
+        return
+    run_gunicorn(args)
+
+
+if __name__ == "__main__":
+    main()
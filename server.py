@@ -1,33 +1,143 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash
-import cv2, base64, random, sqlite3, os
+from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash, Response, g
+from flask_sock import Sock
+import base64, json, sqlite3, os, sys, threading, time
 import numpy as np
-from fer import FER
+from concurrent.futures import TimeoutError as FutureTimeout
+from admission import AdmissionController, ADMIT, FALLBACK, SHED
+from inference import InferencePool
+from frame_cache import FrameCache, dhash
+from streaming import MoodStream
+from catalog import Catalog, CATALOG_PATH
+from snapshot import SnapshotCatalog
+from ranking import Recommender
+from feedback import InteractionLog
+from cf import ReloadingModel
+from accounts import UserStore
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'
+sock = Sock(app)
 
 # Ensure database folder exists
 if not os.path.exists("database"):
     os.makedirs("database")
 
-# Init database
-def init_db():
-    conn = sqlite3.connect("database/users.db")
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email TEXT UNIQUE,
-                    password TEXT,
-                    age INTEGER,
-                    gender TEXT
-                )''')
-    conn.commit()
-    conn.close()
-
-init_db()
-
-# FER Detector
-detector = FER(mtcnn=True)
+# Init database (pooled per-thread connections, WAL mode)
+users = UserStore("database/users.db",
+                  cache_ttl=float(os.environ.get("USER_CACHE_TTL", 30)))
+users.create_schema()
+
+def current_user():
+    """The logged-in user, served from the short-TTL lookup cache."""
+    if "user" not in session:
+        return None
+    return users.get_user(session["user"])
+
+# Metrics exposed at /metrics (per process, Prometheus text format)
+REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by endpoint and status.",
+                            ["endpoint", "status"])
+REQUEST_SECONDS = REGISTRY.histogram("http_request_seconds", "HTTP request latency.", ["endpoint"])
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Latency of each mood-detection stage.", ["stage"])
+ERRORS = REGISTRY.counter("detect_errors_total", "Failed mood detections by exception type.",
+                          ["endpoint", "type"])
+NO_FACE = REGISTRY.counter("no_face_total", "Frames in which no face was found.", ["endpoint"])
+MOODS = REGISTRY.counter("moods_total", "Detected or selected moods.", ["source", "mood"])
+QUEUE_DEPTH = REGISTRY.gauge("inference_queue_depth", "Frames waiting to be batched.")
+IN_FLIGHT = REGISTRY.gauge("inference_in_flight", "Frames submitted and not yet answered.")
+ADMISSIONS = REGISTRY.counter("detect_admissions_total", "Admission decisions for mood detection.",
+                              ["decision"])
+DEGRADED = REGISTRY.counter("detect_degraded_total", "Detections answered in a degraded mode.",
+                            ["mode"])
+STALE_FRAMES = REGISTRY.counter("stream_frames_skipped_total",
+                                "Live frames dropped because a newer one was already queued.")
+PRESSURE = REGISTRY.gauge("detect_pressure", "Detection queue occupancy as a fraction of its depth.")
+
+BASE64_SECONDS = STAGE_SECONDS.labels(stage="base64_decode")
+IMDECODE_SECONDS = STAGE_SECONDS.labels(stage="imdecode")
+SELECTION_SECONDS = STAGE_SECONDS.labels(stage="song_selection")
+
+def record_inference_timings(timings):
+    """Feed stage timings reported by the inference workers into the histogram."""
+    for stage, durations in timings.items():
+        histogram = STAGE_SECONDS.labels(stage=stage)
+        for seconds in durations:
+            histogram.observe(seconds)
+
+# Mood detection from camera frames. Set VISION_ENABLED=0 for emoji-only
+# deployments that never import OpenCV or load the emotion model.
+VISION_ENABLED = os.environ.get("VISION_ENABLED", "1") != "0"
+# Load OpenCV and the model in the background at startup instead of on first use
+VISION_WARMUP = os.environ.get("VISION_WARMUP", "1") != "0"
+
+# FER Detector (pool of worker processes, each with its own model)
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", os.cpu_count() or 1))
+INFERENCE_MAX_BATCH = int(os.environ.get("INFERENCE_MAX_BATCH", 8))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", 10))
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", 30))
+# Face detector backend: "haar" (fast default), "mediapipe" or "mtcnn" (high accuracy)
+FACE_DETECTOR = os.environ.get("FACE_DETECTOR", "haar")
+FACE_DETECTION_WIDTH = int(os.environ.get("FACE_DETECTION_WIDTH", 320))
+
+detector = InferencePool(workers=INFERENCE_WORKERS,
+                         max_batch_size=INFERENCE_MAX_BATCH,
+                         max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                         backend=FACE_DETECTOR,
+                         detection_width=FACE_DETECTION_WIDTH,
+                         on_timings=record_inference_timings) if VISION_ENABLED else None
+QUEUE_DEPTH.set_function(lambda: detector.queue_depth if detector else 0)
+IN_FLIGHT.set_function(lambda: detector.in_flight if detector else 0)
+
+def warm_up_vision():
+    """Import OpenCV and start the inference workers so their models load."""
+    import cv2  # noqa: F401
+    detector.start()
+
+def start_vision_warmup():
+    """Warm up in the background; called by the process that serves requests."""
+    if detector is not None and VISION_WARMUP:
+        threading.Thread(target=warm_up_vision, name="vision-warmup", daemon=True).start()
+
+# Results for repeated / near-identical frames, keyed by perceptual hash
+mood_cache = FrameCache(max_entries=int(os.environ.get("MOOD_CACHE_SIZE", 512)),
+                        ttl=float(os.environ.get("MOOD_CACHE_TTL", 30)),
+                        max_distance=int(os.environ.get("MOOD_CACHE_DISTANCE", 4)))
+
+# Live streaming: mean pixel change needed to re-analyse, and EMA smoothing factor
+STREAM_MOTION_THRESHOLD = float(os.environ.get("STREAM_MOTION_THRESHOLD", 6))
+STREAM_SMOOTHING = float(os.environ.get("STREAM_SMOOTHING", 0.3))
+
+# Admission control for mood detection: queue depth, per-request deadline (seconds)
+# and the queue fractions at which detection degrades (see admission.py)
+DETECT_QUEUE_DEPTH = int(os.environ.get("DETECT_QUEUE_DEPTH", INFERENCE_WORKERS * INFERENCE_MAX_BATCH * 2))
+DETECT_DEADLINE = float(os.environ.get("DETECT_DEADLINE", 3))
+DETECT_DEGRADE_AT = float(os.environ.get("DETECT_DEGRADE_AT", 0.5))
+DETECT_FALLBACK_AT = float(os.environ.get("DETECT_FALLBACK_AT", 0.75))
+# Degraded mode: frame width sent to the detector, looser cache matching,
+# and how old a client's last detected mood may be to stand in for a new one
+DEGRADED_FRAME_WIDTH = int(os.environ.get("DEGRADED_FRAME_WIDTH", 160))
+FALLBACK_CACHE_DISTANCE = int(os.environ.get("FALLBACK_CACHE_DISTANCE", 12))
+LAST_MOOD_MAX_AGE = float(os.environ.get("LAST_MOOD_MAX_AGE", 300))
+
+admission = AdmissionController(max_queue=DETECT_QUEUE_DEPTH,
+                                deadline=DETECT_DEADLINE,
+                                degrade_at=DETECT_DEGRADE_AT,
+                                fallback_at=DETECT_FALLBACK_AT,
+                                load=lambda: detector.in_flight if detector else 0)
+PRESSURE.set_function(lambda: admission.pressure)
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def count_request(response):
+    endpoint = request.endpoint or "unknown"
+    REQUESTS.labels(endpoint=endpoint, status=response.status_code).inc()
+    start = g.get("start_time")
+    if start is not None:
+        REQUEST_SECONDS.labels(endpoint=endpoint).observe(time.perf_counter() - start)
+    return response
 
 # ================= INTRO =================
 @app.route("/")
@@ -43,17 +153,12 @@ def signup():
         age = request.form.get("age")
         gender = request.form.get("gender")
 
-        conn = sqlite3.connect("database/users.db")
-        c = conn.cursor()
         try:
-            c.execute("INSERT INTO users (email, password, age, gender) VALUES (?, ?, ?, ?)",
-                      (email, password, age, gender))
-            conn.commit()
+            users.add_user(email, password, age, gender)
             flash("✅ Signup successful! Please log in.", "success")
             return redirect(url_for("login"))
         except sqlite3.IntegrityError:
             flash("⚠️ Email already registered!", "error")
-        conn.close()
     return render_template("signup.html")
 
 # ================= LOGIN =================
@@ -63,14 +168,11 @@ def login():
         email = request.form["email"]
         password = request.form["password"]
 
-        conn = sqlite3.connect("database/users.db")
-        c = conn.cursor()
-        c.execute("SELECT * FROM users WHERE email=? AND password=?", (email, password))
-        user = c.fetchone()
-        conn.close()
+        user = users.authenticate(email, password)
 
         if user:
             session["user"] = email
+            session["user_id"] = user["id"]
             flash("✅ Login successful!", "success")
             return redirect(url_for("recommend"))
         else:
@@ -82,119 +184,419 @@ def login():
 # ================= RECOMMEND PAGE =================
 @app.route("/recommend")
 def recommend():
-    if "user" not in session:
+    if current_user() is None:
         return redirect(url_for("login"))
     return render_template("recommend.html")
 
 @app.route("/logout")
 def logout():
     session.pop("user", None)
+    session.pop("user_id", None)
     flash("👋 You have been logged out.", "info")
     return redirect(url_for("login"))
 
 # ================= SONGS =================
-mood_to_songs = {
-    "happy": [
-        {"name": "Happy", "singer": "Pharrell Williams", "spotify_url": "https://open.spotify.com/track/60nZcImufyMA1MKQY3dcCH"},
-        {"name": "Uptown Funk", "singer": "Bruno Mars", "spotify_url": "https://open.spotify.com/track/32OlwWuMpZ6b0aN2RZOeMS"},
-        {"name": "Can’t Stop the Feeling", "singer": "Justin Timberlake", "spotify_url": "https://open.spotify.com/track/6JV2JOEocMgcZxYSZelKcc"},
-        {"name": "Good Life", "singer": "OneRepublic", "spotify_url": "https://open.spotify.com/track/6OtCIsQZ64Vs1EbzztvAv4"},
-        {"name": "Shake It Off", "singer": "Taylor Swift", "spotify_url": "https://open.spotify.com/track/5xTtaWoae3wi06K5WfVUUH"},
-        {"name": "I Gotta Feeling", "singer": "Black Eyed Peas", "spotify_url": "https://open.spotify.com/track/4bHsxqR3GMrXTxEPLuK5ue"},
-        {"name": "On Top of the World", "singer": "Imagine Dragons", "spotify_url": "https://open.spotify.com/track/6KuHjfXHkfnIjdmcIvt9r0"},
-        {"name": "Best Day of My Life", "singer": "American Authors", "spotify_url": "https://open.spotify.com/track/5Hroj5K7vLpIG4FNCRIjbP"},
-        {"name": "Sugar", "singer": "Maroon 5", "spotify_url": "https://open.spotify.com/track/494OU6M7NOf4ICYb4zWCf5"},
-        {"name": "Firework", "singer": "Katy Perry", "spotify_url": "https://open.spotify.com/track/4jCj0C5eaM3yTQpYJ1dHzT"},
-    ],
-    "sad": [
-        {"name": "Someone Like You", "singer": "Adele", "spotify_url": "https://open.spotify.com/track/4kflIGfjdZJW4ot2ioixTB"},
-        {"name": "Let Her Go", "singer": "Passenger", "spotify_url": "https://open.spotify.com/track/2jyjhRf6DVbMPU5zxagN2h"},
-        {"name": "Fix You", "singer": "Coldplay", "spotify_url": "https://open.spotify.com/track/7LVHVU3tWfcxj5aiPFEW4Q"},
-        {"name": "Stay With Me", "singer": "Sam Smith", "spotify_url": "https://open.spotify.com/track/3jjujdWJ72nww5eGnfs2E7"},
-        {"name": "When I Was Your Man", "singer": "Bruno Mars", "spotify_url": "https://open.spotify.com/track/0nJW01T7XtvILxQgC5J7Wh"},
-        {"name": "All I Want", "singer": "Kodaline", "spotify_url": "https://open.spotify.com/track/0MlTOiC5ZYKFGeZ8h3D4rd"},
-        {"name": "Say Something", "singer": "A Great Big World", "spotify_url": "https://open.spotify.com/track/2aBxt229cbLDOvtL7Xbb9x"},
-        {"name": "The Night We Met", "singer": "Lord Huron", "spotify_url": "https://open.spotify.com/track/0sQLhU6sAuQG2iJQyF4kOx"},
-        {"name": "Jealous", "singer": "Labrinth", "spotify_url": "https://open.spotify.com/track/3dT4hzxwPjKYQxDq2AvivO"},
-        {"name": "With or Without You", "singer": "U2", "spotify_url": "https://open.spotify.com/track/5J4PZby3pi0wfQWmVHg6Y7"},
-    ],
-    "angry": [
-        {"name": "In The End", "singer": "Linkin Park", "spotify_url": "https://open.spotify.com/track/60a0Rd6pjrkxjPbaKzXjfq"},
-        {"name": "Break Stuff", "singer": "Limp Bizkit", "spotify_url": "https://open.spotify.com/track/5UoFrZbjWKQUn0KPLWgwhT"},
-        {"name": "Killing In The Name", "singer": "RATM", "spotify_url": "https://open.spotify.com/track/4u7EnebtmKWzUH433cf5Qv"},
-        {"name": "Smells Like Teen Spirit", "singer": "Nirvana", "spotify_url": "https://open.spotify.com/track/5ghIJDpPoe3CfHMGu71E6T"},
-        {"name": "Duality", "singer": "Slipknot", "spotify_url": "https://open.spotify.com/track/6QgjcU0zLnzq5OrUoSZ3OK"},
-        {"name": "Down With The Sickness", "singer": "Disturbed", "spotify_url": "https://open.spotify.com/track/2DlHlPMa4M17kufBvI2lEN"},
-        {"name": "Enter Sandman", "singer": "Metallica", "spotify_url": "https://open.spotify.com/track/5sICkBXVmaCQk5aISGR3x1"},
-        {"name": "Bulls on Parade", "singer": "RATM", "spotify_url": "https://open.spotify.com/track/4oN6KR2hAm5JTYo5kxv8aD"},
-        {"name": "Bodies", "singer": "Drowning Pool", "spotify_url": "https://open.spotify.com/track/5r6Vi8ghsl7W95Y0UHMgCy"},
-        {"name": "Faint", "singer": "Linkin Park", "spotify_url": "https://open.spotify.com/track/5w3slHyJp3ihX5mymXy4pM"},
-    ],
-    "neutral": [
-        {"name": "Shape of You", "singer": "Ed Sheeran", "spotify_url": "https://open.spotify.com/track/7qiZfU4dY1lWllzX7mPBI3"},
-        {"name": "Counting Stars", "singer": "OneRepublic", "spotify_url": "https://open.spotify.com/track/2tpWsVSb9UEmDRxAl1zhX1"},
-        {"name": "Rolling in the Deep", "singer": "Adele", "spotify_url": "https://open.spotify.com/track/4OSBTYWVwsQhGLF9NHvIbR"},
-        {"name": "Perfect", "singer": "Ed Sheeran", "spotify_url": "https://open.spotify.com/track/0tgVpDi06FyKpA1z0VMD4v"},
-        {"name": "Photograph", "singer": "Ed Sheeran", "spotify_url": "https://open.spotify.com/track/1HNkqx9Ahdgi1Ixy2xkKkL"},
-        {"name": "Hall of Fame", "singer": "The Script", "spotify_url": "https://open.spotify.com/track/0jQpzzUwC8FrQ1Z21aWztN"},
-        {"name": "Cheap Thrills", "singer": "Sia", "spotify_url": "https://open.spotify.com/track/4pNApnaUWAL2J4KO2eqokq"},
-        {"name": "Stay", "singer": "Rihanna", "spotify_url": "https://open.spotify.com/track/2gZUPNdnz5Y45eiGxpHGSc"},
-        {"name": "A Sky Full of Stars", "singer": "Coldplay", "spotify_url": "https://open.spotify.com/track/2sSyjEshk5U1S4nTbB4ShJ"},
-        {"name": "Memories", "singer": "Maroon 5", "spotify_url": "https://open.spotify.com/track/2NmsngXHeC1GQ9wWrzhOMf"},
-    ],
-    "surprise": [
-        {"name": "Believer", "singer": "Imagine Dragons", "spotify_url": "https://open.spotify.com/track/0pqnGHJpmpxLKifKRmU6WP"},
-        {"name": "Thunder", "singer": "Imagine Dragons", "spotify_url": "https://open.spotify.com/track/1zB4vmk8tFRmM9UULNzbLB"},
-        {"name": "Stronger", "singer": "Kanye West", "spotify_url": "https://open.spotify.com/track/5D4cdSZ6f3j2cGl9LJZNlU"},
-        {"name": "Titanium", "singer": "David Guetta", "spotify_url": "https://open.spotify.com/track/45wXjjX9g4BTQoyKp7jGxm"},
-        {"name": "Wake Me Up", "singer": "Avicii", "spotify_url": "https://open.spotify.com/track/0nrRP2bk19rLc0orkWPQk2"},
-        {"name": "Fireflies", "singer": "Owl City", "spotify_url": "https://open.spotify.com/track/2VxeLyX666F8uXCJ0dZF8B"},
-        {"name": "Radioactive", "singer": "Imagine Dragons", "spotify_url": "https://open.spotify.com/track/4G8gkOterJn0Ywt6uhqbhp"},
-        {"name": "We Found Love", "singer": "Rihanna", "spotify_url": "https://open.spotify.com/track/4KBeYlgkHhGXlDUl9RrY5e"},
-        {"name": "On The Floor", "singer": "Jennifer Lopez", "spotify_url": "https://open.spotify.com/track/2KsP6tYLJlTBvSUxnwlVWa"},
-        {"name": "Stronger (What Doesn’t Kill You)", "singer": "Kelly Clarkson", "spotify_url": "https://open.spotify.com/track/7o7E1r7hMaS8mx3v0xkhOm"},
-    ]
-}
+# Shared SQLite catalog (same store the CLI uses), sampled per mood by index.
+# With CATALOG_SNAPSHOT set, serve a memory-mapped snapshot built with
+# `python snapshot.py build` instead; rebuilt snapshots are picked up live.
+CATALOG_SNAPSHOT = os.environ.get("CATALOG_SNAPSHOT")
+if CATALOG_SNAPSHOT:
+    catalog = SnapshotCatalog(CATALOG_SNAPSHOT,
+                              check_interval=float(os.environ.get("SNAPSHOT_CHECK_INTERVAL", 5)))
+else:
+    catalog = Catalog(os.environ.get("CATALOG_PATH", CATALOG_PATH))
+    catalog.ensure_schema()
+
+# Listening feedback, batched into the append-only interactions table
+interactions = InteractionLog("database/users.db")
+
+# Optional collaborative-filtering factors trained offline with `python cf.py train`
+CF_MODEL_PATH = os.environ.get("CF_MODEL_PATH", "database/cf_model.npz")
+CF_WEIGHT = float(os.environ.get("CF_WEIGHT", 0.3))
+# (reloaded when retrained, checked at most every CF_CHECK_INTERVAL seconds)
+cf_model = ReloadingModel(CF_MODEL_PATH, check_interval=float(os.environ.get("CF_CHECK_INTERVAL", 5)))
+
+# Ranks the whole catalog against the detected emotion distribution
+RANKING_DIVERSITY = float(os.environ.get("RANKING_DIVERSITY", 0.1))
+recommender = Recommender(catalog, diversity=RANKING_DIVERSITY,
+                          personalizer=cf_model, personal_weight=CF_WEIGHT)
 
 # ================= APIs =================
-@app.route("/detect_mood", methods=["POST"])
-def detect_mood():
-    try:
-        data = request.json['image']
-        img_data = base64.b64decode(data.split(',')[1])
+EMOJI_TO_MOOD = {
+    "😊": "happy",
+    "😢": "sad",
+    "😡": "angry",
+    "😲": "surprise",
+    "🙂": "neutral"
+}
+
+# Largest number of emojis plus images accepted by /batch_recommend
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 64))
+
+def decode_data_url(data):
+    """Bytes of a ``data:image/...;base64,`` URL (or bare base64 string)."""
+    with BASE64_SECONDS.time():
+        return base64.b64decode(data.split(',')[-1])
+
+class VisionDisabled(RuntimeError):
+    """Raised by frame routes when the server runs in emoji-only mode."""
+
+def require_vision():
+    if detector is None:
+        raise VisionDisabled("Mood detection is disabled on this server")
+
+def decode_frame(img_data):
+    import cv2
+    with IMDECODE_SECONDS.time():
         np_arr = np.frombuffer(img_data, np.uint8)
         frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Could not decode image")
+    return frame
+
+def read_frame():
+    """Decode the uploaded frame.
+
+    Accepts raw JPEG/WebP/PNG bytes (``image/*`` or ``application/octet-stream``),
+    a multipart upload with an ``image`` file, or the legacy JSON data URL.
+    """
+    if request.mimetype == "application/json":
+        img_data = decode_data_url(request.json['image'])
+    elif request.mimetype == "multipart/form-data":
+        img_data = request.files["image"].read()
+    else:
+        img_data = request.get_data(cache=False)
+    return decode_frame(img_data)
+
+def primary_emotions(results, endpoint):
+    """Emotion scores of the largest face, or neutral when no face was found."""
+    if not results:
+        NO_FACE.labels(endpoint=endpoint).inc()
+        return {"neutral": 1.0}
+    return results[0]["emotions"]
+
+class Busy(RuntimeError):
+    """Raised when a detection cannot be served within the admission limits."""
+
+def busy_response(message):
+    """Fast 503 telling the client when to try again."""
+    retry_after = admission.retry_after()
+    response = jsonify({"error": message, "busy": True, "retry_after": retry_after})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after)
+    return response
 
-        results = detector.detect_emotions(frame)
-        mood = "neutral"
+def last_known_emotions():
+    """Emotions of this client's last detected face, if recent enough."""
+    last = session.get("last_mood")
+    if not last or time.time() - last["at"] > LAST_MOOD_MAX_AGE:
+        return None
+    return last["emotions"]
+
+def shrink_frame(frame, width):
+    import cv2
+    h, w = frame.shape[:2]
+    if not width or w <= width:
+        return frame
+    return cv2.resize(frame, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+
+def run_detection(decision):
+    """Emotions for the uploaded frame under an admitted ``decision``.
+
+    Returns ``(emotions, degraded)``; ``degraded`` names the fallback used
+    (``reduced_resolution``, ``cached`` or ``last_known``) or is ``None``.
+    Always releases the admission slot.
+    """
+    latency = None
+    try:
+        frame = read_frame()
+        frame_key = dhash(frame)
+        degraded = None
+        if decision == FALLBACK:
+            # One lookup with the looser tolerance, so it counts as one hit or miss
+            results = mood_cache.get(frame_key, max_distance=FALLBACK_CACHE_DISTANCE)
+            if results is not None:
+                degraded = "cached"
+            elif last_known_emotions() is not None:
+                return last_known_emotions(), "last_known"
+        else:
+            results = mood_cache.get(frame_key)
+        if results is None:
+            if decision != ADMIT:
+                frame = shrink_frame(frame, DEGRADED_FRAME_WIDTH)
+                degraded = "reduced_resolution"
+            start = time.monotonic()
+            try:
+                results = detector.detect_emotions(frame, timeout=DETECT_DEADLINE)
+            except (TimeoutError, FutureTimeout):
+                latency = DETECT_DEADLINE
+                if last_known_emotions() is None:
+                    raise Busy("Mood detection timed out, please retry")
+                return last_known_emotions(), "last_known"
+            latency = time.monotonic() - start
+            if degraded is None:
+                # Downscaled results would be served as full answers for the whole TTL
+                mood_cache.put(frame_key, results)
         if results:
-            emotions = results[0]["emotions"]
-            mood = max(emotions, key=emotions.get)
+            session["last_mood"] = {"emotions": results[0]["emotions"], "at": time.time()}
+        return primary_emotions(results, "detect_mood"), degraded
+    finally:
+        admission.release(latency)
 
-        songs = random.sample(mood_to_songs[mood], k=4)
-        return jsonify({"mood": mood, "songs": songs})
+@app.route("/detect_mood", methods=["POST"])
+def detect_mood():
+    """Mood and songs for an uploaded frame, degrading gracefully under load."""
+    try:
+        require_vision()
+        decision = admission.admit()
+        ADMISSIONS.labels(decision=decision).inc()
+        if decision == SHED:
+            emotions, degraded = last_known_emotions(), "last_known"
+            if emotions is None:
+                return busy_response("Mood detection is busy, please retry")
+        else:
+            emotions, degraded = run_detection(decision)
+        if degraded:
+            DEGRADED.labels(mode=degraded).inc()
+        mood = max(emotions, key=emotions.get)
+        MOODS.labels(source="camera", mood=mood).inc()
+
+        with SELECTION_SECONDS.time():
+            songs = recommender.recommend(emotions, k=4, user_id=session.get("user_id"))
+        body = {"mood": mood, "songs": songs, "emotions": emotions}
+        if degraded:
+            body["degraded"] = degraded
+        return jsonify(body)
+    except VisionDisabled as e:
+        return jsonify({"error": str(e)}), 503
+    except Busy as e:
+        return busy_response(str(e))
     except Exception as e:
+        ERRORS.labels(endpoint="detect_mood", type=type(e).__name__).inc()
         return jsonify({"error": str(e)})
 
+def newest_frame(ws):
+    """Wait for the next message, then skip ahead to the newest one queued.
+
+    Frames that arrived while the previous one was being analysed are
+    stale; only the latest keeps live mode in step with the camera.
+    """
+    message = ws.receive()
+    while True:
+        newer = ws.receive(timeout=0)
+        if newer is None:
+            return message
+        if isinstance(newer, (bytes, bytearray)):
+            if isinstance(message, (bytes, bytearray)):
+                STALE_FRAMES.inc()
+            message = newer
+
+@sock.route("/ws/mood")
+def mood_stream(ws):
+    if "user" not in session:
+        ws.close(reason=1008, message="login required")
+        return
+    if detector is None:
+        ws.close(reason=1011, message="mood detection is disabled")
+        return
+    import cv2
+    stream = MoodStream(motion_threshold=STREAM_MOTION_THRESHOLD, alpha=STREAM_SMOOTHING)
+    while True:
+        message = newest_frame(ws)
+        if not isinstance(message, (bytes, bytearray)):
+            continue
+        with IMDECODE_SECONDS.time():
+            frame = cv2.imdecode(np.frombuffer(message, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            ERRORS.labels(endpoint="ws_mood", type="DecodeError").inc()
+            ws.send(json.dumps({"error": "Could not decode image"}))
+            continue
+        if not stream.needs_inference(frame):
+            continue
+        try:
+            results = detector.detect_emotions(frame, timeout=INFERENCE_TIMEOUT)
+        except Exception as e:
+            ERRORS.labels(endpoint="ws_mood", type=type(e).__name__).inc()
+            ws.send(json.dumps({"error": str(e)}))
+            continue
+        if not results:
+            NO_FACE.labels(endpoint="ws_mood").inc()
+            continue
+        mood = stream.update(results[0]["emotions"])
+        if mood:
+            MOODS.labels(source="stream", mood=mood).inc()
+            with SELECTION_SECONDS.time():
+                songs = recommender.recommend(stream.smoothed, k=4, user_id=session.get("user_id"))
+            ws.send(json.dumps({"mood": mood, "songs": songs, "emotions": stream.smoothed}))
+
+@app.route("/cache_stats")
+def cache_stats():
+    return jsonify(mood_cache.stats())
+
+@app.route("/ready")
+def ready():
+    """Readiness probe: 200 once every enabled feature can serve requests."""
+    vision = detector.status() if detector is not None else {"state": "disabled"}
+    try:
+        catalog.mood_count("happy")
+        catalog_state = "ready"
+    except (sqlite3.Error, OSError, ValueError) as e:
+        catalog_state = f"failed: {e}"
+    # "idle" means the model will load on the first detection request
+    is_ready = catalog_state == "ready" and vision["state"] in ("ready", "idle", "disabled")
+    body = {"ready": is_ready, "catalog": catalog_state, "vision": vision}
+    return jsonify(body), 200 if is_ready else 503
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route("/emoji_recommend", methods=["POST"])
 def emoji_recommend():
     try:
         data = request.json
         emoji = data.get("emoji")
 
-        emoji_to_mood = {
-            "😊": "happy",
-            "😢": "sad",
-            "😡": "angry",
-            "😲": "surprise",
-            "🙂": "neutral"
-        }
-
-        mood = emoji_to_mood.get(emoji, "neutral")
-        songs = random.sample(mood_to_songs[mood], k=4)
+        mood = EMOJI_TO_MOOD.get(emoji, "neutral")
+        MOODS.labels(source="emoji", mood=mood).inc()
+        with SELECTION_SECONDS.time():
+            songs = recommender.recommend({mood: 1.0}, k=4, user_id=session.get("user_id"))
         return jsonify({"mood": mood, "songs": songs})
     except Exception as e:
+        ERRORS.labels(endpoint="emoji_recommend", type=type(e).__name__).inc()
         return jsonify({"error": str(e)})
 
+@app.route("/batch_recommend", methods=["POST"])
+def batch_recommend():
+    """Recommendations for many emojis and/or frames in one request.
+
+    Accepts JSON ``{"emojis": [...], "images": [data URL, ...]}`` or a
+    multipart form with repeated ``emojis`` fields and ``images`` files.
+    Frames are submitted to the inference pool together so they share model
+    batches, and all items are ranked with one scoring pass. Each item gets
+    its own result; a bad item carries an ``error`` instead of failing the
+    whole batch. Frames that miss the cache go through admission control
+    one by one like ``/detect_mood``: once the queue is full the remaining
+    frames are answered as busy instead of crowding out other clients.
+    """
+    if request.mimetype == "multipart/form-data":
+        emojis = request.form.getlist("emojis")
+        images = request.files.getlist("images")
+    else:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Send a JSON object with \"emojis\" and/or \"images\""}), 400
+        emojis = data.get("emojis") or []
+        images = data.get("images") or []
+    if not isinstance(emojis, list) or not isinstance(images, list):
+        return jsonify({"error": "\"emojis\" and \"images\" must be lists"}), 400
+    if len(emojis) + len(images) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Send at most {BATCH_MAX_ITEMS} emojis and images"}), 413
+    if images and not emojis and detector is None:
+        return jsonify({"error": "Mood detection is disabled on this server"}), 503
+
+    emoji_results = []
+    for emoji in emojis:
+        if not isinstance(emoji, str):
+            ERRORS.labels(endpoint="batch_recommend", type="InvalidEmoji").inc()
+            emoji_results.append({"emoji": emoji, "error": "Emoji must be a string"})
+            continue
+        mood = EMOJI_TO_MOOD.get(emoji, "neutral")
+        MOODS.labels(source="emoji", mood=mood).inc()
+        emoji_results.append({"emoji": emoji, "mood": mood, "emotions": {mood: 1.0}})
+
+    # Decode every frame and submit cache misses to the pool before waiting on any
+    start = time.monotonic()
+    deadline = start + DETECT_DEADLINE
+    image_results, pending = [], []
+    for index, image in enumerate(images):
+        if detector is None:
+            image_results.append({"error": "Mood detection is disabled on this server"})
+            continue
+        try:
+            frame = decode_frame(image.read() if hasattr(image, "read") else decode_data_url(image))
+            frame_key = dhash(frame)
+            results = mood_cache.get(frame_key)
+        except Exception as e:
+            ERRORS.labels(endpoint="batch_recommend", type=type(e).__name__).inc()
+            image_results.append({"error": str(e)})
+            continue
+        if results is not None:
+            image_results.append({"results": results})
+            continue
+        decision = admission.admit()
+        ADMISSIONS.labels(decision=decision).inc()
+        if decision == SHED:
+            image_results.append({"error": "Mood detection is busy, please retry",
+                                  "busy": True, "retry_after": admission.retry_after()})
+            continue
+        degraded = None
+        if decision != ADMIT:
+            frame = shrink_frame(frame, DEGRADED_FRAME_WIDTH)
+            degraded = "reduced_resolution"
+            DEGRADED.labels(mode=degraded).inc()
+        try:
+            pending.append((index, frame_key, degraded, detector.submit(frame, deadline)))
+            image_results.append({"results": None})
+        except Exception as e:
+            admission.release()
+            ERRORS.labels(endpoint="batch_recommend", type=type(e).__name__).inc()
+            image_results.append({"error": str(e)})
+
+    for index, frame_key, degraded, future in pending:
+        latency = None
+        try:
+            results = future.result(max(0.0, deadline - time.monotonic()))
+            latency = time.monotonic() - start
+            if degraded is None:
+                mood_cache.put(frame_key, results)
+                image_results[index] = {"results": results}
+            else:
+                image_results[index] = {"results": results, "degraded": degraded}
+        except Exception as e:
+            if isinstance(e, (TimeoutError, FutureTimeout)):
+                latency = DETECT_DEADLINE
+            ERRORS.labels(endpoint="batch_recommend", type=type(e).__name__).inc()
+            image_results[index] = {"error": str(e) or type(e).__name__}
+        finally:
+            admission.release(latency)
+
+    for item in image_results:
+        if "results" in item:
+            emotions = primary_emotions(item.pop("results"), "batch_recommend")
+            item["mood"] = max(emotions, key=emotions.get)
+            item["emotions"] = emotions
+            MOODS.labels(source="camera", mood=item["mood"]).inc()
+
+    ranked = [item for item in emoji_results + image_results if "emotions" in item]
+    with SELECTION_SECONDS.time():
+        playlists = recommender.recommend_many([item["emotions"] for item in ranked], k=4,
+                                               user_id=session.get("user_id"))
+    for item, songs in zip(ranked, playlists):
+        item["songs"] = songs
+    for item in emoji_results:
+        item.pop("emotions", None)
+    return jsonify({"emojis": emoji_results, "images": image_results})
+
+@app.route("/feedback", methods=["POST"])
+def feedback():
+    user = current_user()
+    if user is None:
+        return jsonify({"error": "login required"}), 401
+    try:
+        data = request.json
+        interactions.record(user["id"], data["song_id"], data.get("event", "click"))
+        return jsonify({"ok": True})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Spawned inference workers would otherwise re-run this script as
+    # ``__mp_main__`` and build a whole app each; they only need inference.py.
+    # The reloader is told to watch the script explicitly instead.
+    script = os.path.abspath(__file__)
+    del sys.modules["__main__"].__file__
+    # With the reloader, only its child process (WERKZEUG_RUN_MAIN) serves
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_vision_warmup()
+    app.run(debug=True, extra_files=[script])
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Compiled, memory-mapped catalog snapshots for serving.
+
+A snapshot is one read-only file holding everything the recommender needs
+as flat arrays:
+
+- ``song_ids``   int64, sorted, so ids are located with a binary search
+- ``matrix``     float32 emotion-major (7 x tracks) L2-normalised profiles,
+                 ready for ``RankingEngine``
+- ``mood_offsets`` / ``mood_rows``  per-mood row lists (CSR layout)
+- ``<column>_offsets`` / ``<column>_data``  packed UTF-8 string tables for
+  the song name, singer and Spotify URL (an empty string means NULL)
+
+Workers open the file with ``mmap`` and wrap the arrays with NumPy without
+copying, so every process on a host shares one physical copy through the
+page cache and opening a snapshot costs the same for 100 or 10 million
+tracks. Snapshots are rebuilt from the SQLite catalog and published with an
+atomic rename; ``SnapshotCatalog`` notices the new file and swaps it in
+while requests keep using the previous mapping.
+
+File layout: ``MAGIC``, a little-endian uint32 header length, a JSON header
+describing each array (offset, dtype, shape) and the arrays themselves,
+each aligned to 64 bytes.
+
+Usage:
+
+  $ python3 snapshot.py build                       # catalog -> database/catalog.snapshot
+  $ python3 snapshot.py build --db other.db --out other.snapshot
+  $ python3 snapshot.py info database/catalog.snapshot
+"""
+import argparse
+import json
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from catalog import CATALOG_PATH, EMOTIONS, SONG_COLUMNS, Catalog
+from ranking import RankingEngine
+
+SNAPSHOT_PATH = Path("database/catalog.snapshot")
+
+MAGIC = b"MELOSNAP"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+STRING_COLUMNS = SONG_COLUMNS[1:]
+
+
+def _pack_strings(values):
+    """``(offsets, data)`` arrays for a list of strings (``None`` stored as empty)."""
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _write(path, arrays, meta):
+    """Write ``arrays`` to ``path`` atomically (temporary file, fsync, rename)."""
+    header = {"format": FORMAT_VERSION, "arrays": {}, **meta}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        header["arrays"][name] = {"offset": offset, "dtype": array.dtype.str, "shape": array.shape}
+        offset += array.nbytes
+    header_bytes = json.dumps(header).encode("utf-8")
+    base = -(-(len(MAGIC) + 4 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for name, array in arrays.items():
+            f.seek(base + header["arrays"][name]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def build(db_path=CATALOG_PATH, out_path=SNAPSHOT_PATH):
+    """Compile the catalog at ``db_path`` into a snapshot; returns the track count."""
+    catalog = Catalog(db_path)
+    engine = RankingEngine.from_catalog(catalog)
+    order = np.argsort(engine.song_ids, kind="stable")
+    song_ids = engine.song_ids[order]
+    matrix = np.ascontiguousarray(engine.matrix[:, order])
+
+    conn = catalog.connection()
+    columns = {column: [None] * len(song_ids) for column in STRING_COLUMNS}
+    rows = conn.execute(f"SELECT {', '.join(SONG_COLUMNS)} FROM songs ORDER BY id")
+    for row in rows:
+        index = np.searchsorted(song_ids, row[0])
+        if index < len(song_ids) and song_ids[index] == row[0]:
+            for column, value in zip(STRING_COLUMNS, tuple(row)[1:]):
+                columns[column][index] = value
+
+    moods, mood_rows = [], []
+    rows = conn.execute("SELECT mood, song_id FROM song_moods ORDER BY mood, position")
+    for row in rows:
+        if not moods or moods[-1] != row[0]:
+            moods.append(row[0])
+            mood_rows.append([])
+        mood_rows[-1].append(row[1])
+    mood_offsets = np.zeros(len(moods) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in mood_rows], out=mood_offsets[1:])
+    flat = np.fromiter((song_id for ids in mood_rows for song_id in ids), dtype=np.int64,
+                       count=int(mood_offsets[-1]))
+    catalog.close()
+
+    arrays = {
+        "song_ids": song_ids,
+        "matrix": matrix,
+        "mood_offsets": mood_offsets,
+        "mood_rows": np.searchsorted(song_ids, flat).astype(np.int32),
+    }
+    for column, values in columns.items():
+        arrays[f"{column}_offsets"], arrays[f"{column}_data"] = _pack_strings(values)
+
+    _write(out_path, arrays, {"moods": moods, "emotions": list(EMOTIONS),
+                              "tracks": len(song_ids), "created_at": time.time()})
+    return len(song_ids)
+
+
+class Snapshot:
+    """A read-only, memory-mapped catalog snapshot."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a catalog snapshot")
+        (length,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._mmap[start:start + length])
+        if self.header["format"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.header['format']}")
+        base = -(-(start + length) // ALIGNMENT) * ALIGNMENT
+
+        arrays = {}
+        for name, spec in self.header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            if count == 0:
+                arrays[name] = np.empty(spec["shape"], dtype=dtype)
+                continue
+            arrays[name] = np.frombuffer(self._mmap, dtype=dtype, count=count,
+                                         offset=base + spec["offset"]).reshape(spec["shape"])
+        self.song_ids = arrays["song_ids"]
+        self.matrix = arrays["matrix"]
+        self._mood_offsets = arrays["mood_offsets"]
+        self._mood_rows = arrays["mood_rows"]
+        self._strings = {column: (arrays[f"{column}_offsets"], arrays[f"{column}_data"])
+                         for column in STRING_COLUMNS}
+        self._moods = {mood: index for index, mood in enumerate(self.header["moods"])}
+
+    def __len__(self):
+        return len(self.song_ids)
+
+    def _string(self, column, row):
+        offsets, data = self._strings[column]
+        value = data[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+        return value or None
+
+    def song(self, row):
+        """The song dict (``SONG_COLUMNS``) stored at ``row``."""
+        song = {"id": int(self.song_ids[row])}
+        for column in STRING_COLUMNS:
+            song[column] = self._string(column, row)
+        return song
+
+    def get_songs(self, song_ids):
+        """Return songs for ``song_ids`` in the same order, skipping unknown ids."""
+        ids = np.asarray(song_ids, dtype=np.int64)
+        rows = np.searchsorted(self.song_ids, ids)
+        rows[rows >= len(self.song_ids)] = 0
+        found = self.song_ids[rows] == ids if len(self.song_ids) else np.zeros(len(ids), bool)
+        return [self.song(row) for row, ok in zip(rows.tolist(), found.tolist()) if ok]
+
+    def moods(self):
+        return list(self._moods)
+
+    def mood_count(self, mood):
+        index = self._moods.get(mood)
+        if index is None:
+            return 0
+        return int(self._mood_offsets[index + 1] - self._mood_offsets[index])
+
+    def sample_mood(self, mood, k=4):
+        """Return up to ``k`` random songs tagged with ``mood``."""
+        count = self.mood_count(mood)
+        if count == 0:
+            return []
+        start = int(self._mood_offsets[self._moods[mood]])
+        picks = random.sample(range(count), min(k, count))
+        return [self.song(int(self._mood_rows[start + pick])) for pick in picks]
+
+
+class SnapshotCatalog:
+    """Read-only ``Catalog`` stand-in backed by the newest snapshot at ``path``.
+
+    The file is checked at most every ``check_interval`` seconds; when it has
+    been replaced, the new snapshot is mapped and ``version`` is bumped so the
+    ``Recommender`` rebuilds its engine. Readers holding the old snapshot keep
+    a valid mapping until they drop it.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, check_interval=5.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._snapshot = Snapshot(self.path)
+        self._version = 0
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        self._maybe_reload()
+        return self._version
+
+    @property
+    def snapshot(self):
+        self._maybe_reload()
+        return self._snapshot
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+                if (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self._snapshot.identity:
+                    return
+                snapshot = Snapshot(self.path)
+            except (OSError, ValueError):
+                # Keep serving the current snapshot if the new one is unreadable
+                return
+            self._snapshot = snapshot
+            self._version += 1
+
+    def ensure_schema(self):
+        pass
+
+    def profile_matrix(self):
+        snapshot = self.snapshot
+        return snapshot.song_ids, snapshot.matrix
+
+    def get_songs(self, song_ids):
+        return self.snapshot.get_songs(song_ids)
+
+    def moods(self):
+        return self.snapshot.moods()
+
+    def mood_count(self, mood):
+        return self.snapshot.mood_count(mood)
+
+    def sample_mood(self, mood, k=4):
+        return self.snapshot.sample_mood(mood, k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect catalog snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="compile the SQLite catalog into a snapshot")
+    build_parser.add_argument("--db", default=str(CATALOG_PATH))
+    build_parser.add_argument("--out", default=str(SNAPSHOT_PATH))
+    info_parser = commands.add_parser("info", help="describe a snapshot")
+    info_parser.add_argument("path", nargs="?", default=str(SNAPSHOT_PATH))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        tracks = build(args.db, args.out)
+        print(f"Wrote {tracks} tracks to {args.out} in {time.perf_counter() - start:.1f}s")
+    else:
+        snapshot = Snapshot(args.path)
+        header = snapshot.header
+        print(f"{args.path}: {header['tracks']} tracks, {len(header['moods'])} moods, "
+              f"{os.path.getsize(args.path)} bytes, built "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['created_at']))}")
+
+
+if __name__ == "__main__":
+    main()
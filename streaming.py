@@ -0,0 +1,60 @@
+"""
+Per-session state for streaming mood detection over a WebSocket.
+
+The browser keeps one socket open and pushes frames continuously. For each
+connection a ``MoodStream`` decides whether a frame is worth analysing (it
+must differ enough from the last analysed frame), folds new emotion scores
+into an exponential moving average, and reports a mood change only when the
+smoothed distribution's top emotion actually changes.
+"""
+import numpy as np
+
+MOTION_THUMBNAIL = (32, 24)
+
+
+def motion_thumbnail(frame):
+    """Tiny grayscale copy of ``frame`` used for cheap frame differencing."""
+    import cv2  # only needed once frames arrive
+    small = cv2.resize(frame, MOTION_THUMBNAIL, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.int16)
+
+
+class MoodStream:
+    """Motion-gated, EMA-smoothed mood tracking for one streaming session."""
+
+    def __init__(self, motion_threshold=6.0, alpha=0.3):
+        self.motion_threshold = motion_threshold
+        self.alpha = alpha
+        self.smoothed = None
+        self.mood = None
+        self.frames = 0
+        self.analysed = 0
+        self._last_thumbnail = None
+
+    def needs_inference(self, frame):
+        """True when ``frame`` differs enough from the last analysed frame."""
+        self.frames += 1
+        thumbnail = motion_thumbnail(frame)
+        if self._last_thumbnail is not None:
+            motion = float(np.mean(np.abs(thumbnail - self._last_thumbnail)))
+            if motion < self.motion_threshold:
+                return False
+        self._last_thumbnail = thumbnail
+        self.analysed += 1
+        return True
+
+    def update(self, emotions):
+        """Blend a new emotion distribution in; return the new mood if it changed."""
+        if self.smoothed is None:
+            self.smoothed = dict(emotions)
+        else:
+            for emotion, score in emotions.items():
+                previous = self.smoothed.get(emotion, 0.0)
+                self.smoothed[emotion] = previous + self.alpha * (score - previous)
+        mood = max(self.smoothed, key=self.smoothed.get)
+        if mood == self.mood:
+            return None
+        self.mood = mood
+        return mood
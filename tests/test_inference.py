@@ -0,0 +1,87 @@
+"""
+Regression tests for the inference pool's worker supervision.
+
+A stub ``fer`` package is put first on ``sys.path`` (spawned workers inherit
+it), so the tests need OpenCV and NumPy but not TensorFlow.
+"""
+import os
+import signal
+import sys
+import textwrap
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference import InferenceError, InferencePool  # noqa: E402
+
+FER_STUB = """
+import os
+
+class FER:
+    def __init__(self, mtcnn=False):
+        if os.environ.get("FER_STUB_CRASH"):
+            os._exit(3)
+
+    def _classify_emotions(self, faces):
+        import numpy as np
+        return np.zeros((len(faces), 7), np.float32)
+
+    @staticmethod
+    def _get_labels():
+        return {0: "angry", 1: "disgust", 2: "fear", 3: "happy",
+                4: "sad", 5: "surprise", 6: "neutral"}
+"""
+
+FRAME = np.zeros((32, 32, 3), np.uint8)
+
+
+@pytest.fixture
+def fer_stub(tmp_path, monkeypatch):
+    package = tmp_path / "fer"
+    package.mkdir()
+    (package / "__init__.py").write_text(textwrap.dedent(FER_STUB))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delenv("FER_STUB_CRASH", raising=False)
+    return monkeypatch
+
+
+def wait_for(predicate, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_crash_during_load_fails_instead_of_respawning(fer_stub):
+    fer_stub.setenv("FER_STUB_CRASH", "1")
+    pool = InferencePool(workers=2, backend="haar")
+    try:
+        pool.start()
+        assert wait_for(lambda: pool.status()["state"] == "failed")
+        time.sleep(1)
+        status = pool.status()
+        assert status["restarts"] == 0
+        assert status["failed_workers"] == 2
+        assert "code 3" in status["error"]
+        with pytest.raises(InferenceError):
+            pool.submit(FRAME)
+    finally:
+        pool.close()
+
+
+def test_dead_ready_worker_is_replaced(fer_stub):
+    pool = InferencePool(workers=1, backend="haar")
+    try:
+        pool.start()
+        assert wait_for(lambda: pool.status()["state"] == "ready")
+        os.kill(pool._workers[0].pid, signal.SIGKILL)
+        assert wait_for(lambda: pool.restarts == 1 and pool.status()["state"] == "ready")
+        assert pool.detect_emotions(FRAME, timeout=10) == []
+        assert pool.status()["failed_workers"] == 0
+    finally:
+        pool.close()
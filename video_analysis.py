@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Offline mood analysis of recorded sessions and uploaded clips.
+
+Frames are decoded one at a time by moviepy (ffmpeg), sampled at ``--fps``
+and scaled down by ffmpeg to ``--frame-width``, so memory use does not
+depend on the length of the video. Sampled frames that barely differ from
+the last analysed one reuse its result; the others are submitted to an
+``InferencePool`` (detection and classification across worker processes)
+with a bounded number of frames in flight. Results are consumed in order
+and smoothed into a mood timeline, merged into mood segments, and turned
+into a playlist with the same ranking the web app uses: each segment gets
+songs for its average emotion distribution, roughly one per
+``--song-length`` seconds, without repeats.
+
+Usage:
+
+  $ python3 video_analysis.py session.mp4
+  $ python3 video_analysis.py session.mp4 --fps 4 --workers 8 --out session.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from catalog import CATALOG_PATH, Catalog
+from inference import InferenceError, InferencePool
+from ranking import Recommender
+from streaming import MoodStream
+
+
+def open_video(path, frame_width=640):
+    """Open ``path`` with ffmpeg scaling frames to ``frame_width`` (0 keeps the size)."""
+    from moviepy.editor import VideoFileClip
+    return VideoFileClip(str(path), audio=False,
+                         target_resolution=(None, frame_width) if frame_width else None)
+
+
+def sample_frames(clip, fps=2.0):
+    """Yield ``(seconds, BGR frame)`` pairs sampled from ``clip`` at ``fps``."""
+    for t, frame in clip.iter_frames(fps=fps, with_times=True, dtype="uint8"):
+        # moviepy decodes to RGB; the pipeline expects OpenCV's BGR order
+        yield t, np.ascontiguousarray(frame[:, :, ::-1])
+
+
+def analyse(frames, pool, window=32, motion_threshold=3.0, alpha=0.3, progress=None):
+    """Run ``(seconds, frame)`` pairs through ``pool`` and return the timeline.
+
+    At most ``window`` frames are in flight at once. Each timeline point
+    holds the raw scores of the largest face (``None`` when no face was
+    found) and the smoothed mood at that moment. A frame the pool fails on
+    gets ``emotions: None`` and an ``error`` instead of ending the analysis.
+    """
+    stream = MoodStream(motion_threshold=motion_threshold, alpha=alpha)
+    pending = deque()
+    timeline = []
+    last_results = []
+
+    def drain_one():
+        nonlocal last_results
+        t, future = pending.popleft()
+        error = None
+        if future is not None:
+            try:
+                last_results = future.result()
+            except (InferenceError, TimeoutError) as e:
+                # Frames reusing this one's result have nothing to reuse either
+                last_results = []
+                error = str(e)
+        emotions = last_results[0]["emotions"] if last_results else None
+        if emotions is not None:
+            stream.update(emotions)
+        point = {
+            "time": round(t, 3),
+            "faces": len(last_results),
+            "emotions": emotions,
+            "mood": stream.mood,
+        }
+        if error is not None:
+            point["error"] = error
+        timeline.append(point)
+        if progress is not None:
+            progress(t)
+
+    for t, frame in frames:
+        future = pool.submit(frame) if stream.needs_inference(frame) else None
+        pending.append((t, future))
+        if len(pending) >= window:
+            drain_one()
+    while pending:
+        drain_one()
+    return timeline
+
+
+def mood_segments(timeline, duration, min_length=5.0):
+    """Merge consecutive timeline points with the same mood into segments.
+
+    Segments shorter than ``min_length`` seconds are folded into the
+    previous one so brief flickers do not split the timeline.
+    """
+    segments = []
+    for index, point in enumerate(timeline):
+        end = timeline[index + 1]["time"] if index + 1 < len(timeline) else duration
+        if segments and segments[-1]["mood"] == point["mood"]:
+            current = segments[-1]
+        else:
+            current = {"mood": point["mood"], "start": point["time"], "end": end,
+                       "_totals": {}, "_samples": 0}
+            segments.append(current)
+        current["end"] = end
+        if point["emotions"] is not None:
+            current["_samples"] += 1
+            for emotion, score in point["emotions"].items():
+                current["_totals"][emotion] = current["_totals"].get(emotion, 0.0) + score
+
+    merged = []
+    for current in segments:
+        short = current["end"] - current["start"] < min_length
+        if merged and (short or merged[-1]["mood"] == current["mood"]):
+            previous = merged[-1]
+            previous["end"] = current["end"]
+            previous["_samples"] += current["_samples"]
+            for emotion, score in current["_totals"].items():
+                previous["_totals"][emotion] = previous["_totals"].get(emotion, 0.0) + score
+        else:
+            merged.append(current)
+
+    for current in merged:
+        totals, samples = current.pop("_totals"), current.pop("_samples")
+        current["emotions"] = {e: round(s / samples, 3) for e, s in totals.items()} if samples else None
+        current["start"] = round(current["start"], 3)
+        current["end"] = round(current["end"], 3)
+    return merged
+
+
+def build_playlist(segments, recommender, song_length=210.0):
+    """Songs for each mood segment, about one per ``song_length`` seconds."""
+    playlist, chosen = [], []
+    for index, current in enumerate(segments):
+        if current["emotions"] is None:
+            continue
+        k = max(1, round((current["end"] - current["start"]) / song_length))
+        for song in recommender.recommend(current["emotions"], k=k, exclude=chosen):
+            chosen.append(song["id"])
+            playlist.append({"segment": index, "mood": current["mood"], "song": song})
+    return playlist
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a mood timeline and playlist for a video.")
+    parser.add_argument("video")
+    parser.add_argument("--fps", type=float, default=2.0, help="frames analysed per second of video")
+    parser.add_argument("--frame-width", type=int, default=640, help="decode width (0 keeps the original)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="inference processes")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--window", type=int, default=0, help="frames in flight (default 4 per worker)")
+    parser.add_argument("--backend", default="haar", help="face detector: haar, mediapipe or mtcnn")
+    parser.add_argument("--detection-width", type=int, default=320)
+    parser.add_argument("--motion-threshold", type=float, default=3.0,
+                        help="mean pixel change below which a frame reuses the previous result")
+    parser.add_argument("--smoothing", type=float, default=0.3, help="EMA factor for the timeline")
+    parser.add_argument("--min-segment", type=float, default=5.0, help="shortest mood segment in seconds")
+    parser.add_argument("--song-length", type=float, default=210.0, help="seconds of video per song")
+    parser.add_argument("--catalog", default=str(CATALOG_PATH))
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    pool = InferencePool(workers=args.workers, max_batch_size=args.max_batch,
+                         backend=args.backend, detection_width=args.detection_width)
+    clip = open_video(args.video, frame_width=args.frame_width)
+    duration = clip.duration
+
+    reported = -1
+
+    def progress(t):
+        nonlocal reported
+        if int(t) // 10 != reported:
+            reported = int(t) // 10
+            print(f"\ranalysed {t:7.1f}s / {duration:.1f}s", end="", file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    try:
+        timeline = analyse(sample_frames(clip, fps=args.fps), pool,
+                           window=args.window or args.workers * 4,
+                           motion_threshold=args.motion_threshold, alpha=args.smoothing,
+                           progress=progress)
+    finally:
+        clip.close()
+        pool.close()
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+
+    catalog = Catalog(args.catalog)
+    catalog.ensure_schema()
+    segments = mood_segments(timeline, duration, min_length=args.min_segment)
+    playlist = build_playlist(segments, Recommender(catalog, diversity=0.1), args.song_length)
+
+    report = {
+        "video": args.video,
+        "duration": duration,
+        "analysis_seconds": round(elapsed, 2),
+        "speedup": round(duration / elapsed, 2) if elapsed else None,
+        "timeline": timeline,
+        "segments": segments,
+        "playlist": playlist,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Analysed {duration:.1f}s of video in {elapsed:.1f}s; report written to {args.out}",
+              file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()